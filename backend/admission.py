@@ -0,0 +1,215 @@
+import os
+import math
+import time
+import threading
+import collections
+
+import metrics
+
+# ─── Admission control ─────────────────────────────────────────────────
+# LLM-backed requests are admitted per user (the Username header) before
+# any work starts, in two steps:
+#
+#   1. A token bucket per user and endpoint: RATE requests per minute
+#      sustained, with bursts of up to BURST. An empty bucket is an
+#      immediate 429 whose Retry-After is the time until the next token.
+#   2. CONCURRENCY request slots per process. Requests beyond that wait in
+#      a fair queue: one FIFO per user, served round-robin across users,
+#      so a user with a deep backlog delays everyone else by at most one
+#      request per turn. The queue is bounded overall (QUEUE_MAX) and per
+#      user (USER_QUEUE_MAX); a full queue is an immediate 429, and a
+#      request still waiting after QUEUE_TIMEOUT_SECONDS gets a 503.
+#
+# Like the metrics, limits are per process: with several gunicorn workers
+# each enforces its own share.
+#
+#   ADMISSION_ENDPOINT_LIMITS=ask=30:10,...   per-endpoint rate:burst
+ENABLED = os.getenv("ADMISSION", "1") != "0"
+RATE = float(os.getenv("ADMISSION_RATE_PER_MINUTE", "20"))
+BURST = int(os.getenv("ADMISSION_BURST", "5"))
+
+
+def _endpoint_limits(spec):
+    limits = {"summarize": (10, 3), "generate_cards": (6, 2), "generate_quiz": (10, 3), "ask": (30, 10)}
+    for item in spec.split(","):
+        name, _, limit = item.partition("=")
+        if limit:
+            rate, _, burst = limit.partition(":")
+            limits[name.strip()] = (float(rate), int(burst) if burst else BURST)
+    return limits
+
+
+ENDPOINT_LIMITS = _endpoint_limits(os.getenv("ADMISSION_ENDPOINT_LIMITS", ""))
+CONCURRENCY = int(os.getenv("ADMISSION_CONCURRENCY", "8"))
+QUEUE_MAX = int(os.getenv("ADMISSION_QUEUE_MAX", "64"))
+USER_QUEUE_MAX = int(os.getenv("ADMISSION_USER_QUEUE_MAX", "4"))
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "30"))
+# Idle buckets are refilled (equivalent to absent), so they are dropped
+# once this many accumulate.
+MAX_BUCKETS = 10000
+
+
+class Rejected(Exception):
+    """The request was not admitted; retry after `retry_after` seconds."""
+
+    def __init__(self, message, retry_after, status=429):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.status = status
+
+
+_lock = threading.Lock()
+_buckets = {}  # (username, endpoint) -> [tokens, last refill time]
+
+
+def _limits(endpoint):
+    return ENDPOINT_LIMITS.get(endpoint, (RATE, BURST))
+
+
+def _take_token(username, endpoint, now):
+    # Returns 0 if a token was taken, else the seconds until one is available.
+    rate, burst = _limits(endpoint)
+    per_second = rate / 60
+    with _lock:
+        tokens, last = _buckets.get((username, endpoint), (burst, now))
+        tokens = min(burst, tokens + (now - last) * per_second)
+        if tokens < 1:
+            _buckets[username, endpoint] = [tokens, now]
+            return (1 - tokens) / per_second if per_second > 0 else QUEUE_TIMEOUT_SECONDS
+        _buckets[username, endpoint] = [tokens - 1, now]
+        if len(_buckets) > MAX_BUCKETS:
+            for key, (t, seen) in list(_buckets.items()):
+                r, b = _limits(key[1])
+                if t + (now - seen) * r / 60 >= b:
+                    del _buckets[key]
+    return 0
+
+
+def _refund_token(username, endpoint):
+    _, burst = _limits(endpoint)
+    with _lock:
+        bucket = _buckets.get((username, endpoint))
+        if bucket is not None:
+            bucket[0] = min(burst, bucket[0] + 1)
+
+
+class _Waiter:
+    __slots__ = ("event", "granted")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+
+class FairQueue:
+    """`slots` concurrent holders; waiters are granted slots round-robin by
+    user, FIFO within a user."""
+
+    def __init__(self, slots, max_waiting, max_per_user):
+        self.slots = slots
+        self.max_waiting = max_waiting
+        self.max_per_user = max_per_user
+        self._free = slots
+        self._lock = threading.Lock()
+        self._waiting = collections.OrderedDict()  # username -> deque of _Waiter, in turn order
+        self._count = 0
+        # Moving average of how long a slot is held, for Retry-After hints.
+        self._hold_seconds = 1.0
+
+    def waiting(self):
+        return self._count
+
+    def in_use(self):
+        return self.slots - self._free
+
+    def acquire(self, username, timeout):
+        with self._lock:
+            if self._free and not self._count:
+                self._free -= 1
+                return
+            queue = self._waiting.get(username)
+            if self._count >= self.max_waiting or (queue and len(queue) >= self.max_per_user):
+                raise Rejected("Too many requests queued, try again shortly", self._retry_hint())
+            waiter = _Waiter()
+            self._waiting.setdefault(username, collections.deque()).append(waiter)
+            self._count += 1
+
+        waiter.event.wait(timeout)
+        with self._lock:
+            if waiter.granted:
+                return
+            queue = self._waiting[username]
+            queue.remove(waiter)
+            if not queue:
+                del self._waiting[username]
+            self._count -= 1
+            raise Rejected("Timed out waiting for a free slot", self._retry_hint(), status=503)
+
+    def release(self, held_seconds=None):
+        with self._lock:
+            if held_seconds is not None:
+                self._hold_seconds += 0.2 * (held_seconds - self._hold_seconds)
+            if not self._waiting:
+                self._free += 1
+                return
+            # Hand the slot straight to the head of the next user's queue,
+            # then send that user to the back of the rotation.
+            username, queue = next(iter(self._waiting.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._waiting.move_to_end(username)
+            else:
+                del self._waiting[username]
+            self._count -= 1
+            waiter.granted = True
+            waiter.event.set()
+
+    def _retry_hint(self):
+        return self._hold_seconds * (self._count + 1) / self.slots
+
+
+_queue = FairQueue(max(1, CONCURRENCY), QUEUE_MAX, USER_QUEUE_MAX)
+
+
+def waiting():
+    """Requests currently queued for a slot in this process."""
+    return _queue.waiting()
+
+
+def idle():
+    """True while nothing is queued and at most half the slots are taken;
+    background work (see warm_pool.py) only runs then."""
+    return not _queue.waiting() and _queue.in_use() <= _queue.slots // 2
+
+
+def enter(username, endpoint):
+    """Admits one request or raises Rejected. Returns a release(refund=False)
+    callable that must be called once the request's work is finished;
+    refund=True gives the request's token back (for requests rejected as
+    invalid). Extra calls are ignored."""
+    if not ENABLED:
+        return lambda refund=False: None
+
+    wait = _take_token(username, endpoint, time.monotonic())
+    if wait:
+        metrics.ADMISSION.inc(endpoint=endpoint, outcome="throttled")
+        raise Rejected("Rate limit exceeded, slow down", wait)
+
+    start = time.perf_counter()
+    try:
+        _queue.acquire(username, QUEUE_TIMEOUT_SECONDS)
+    except Rejected as e:
+        metrics.ADMISSION.inc(endpoint=endpoint, outcome="queue_full" if e.status == 429 else "timeout")
+        raise
+    admitted = time.perf_counter()
+    metrics.ADMISSION_WAIT_SECONDS.observe(admitted - start, endpoint=endpoint)
+    metrics.ADMISSION.inc(endpoint=endpoint, outcome="admitted")
+
+    once = threading.Lock()
+
+    def release(refund=False):
+        if once.acquire(blocking=False):
+            _queue.release(time.perf_counter() - admitted)
+            if refund:
+                _refund_token(username, endpoint)
+    return release
@@ -0,0 +1,105 @@
+import datetime
+import itertools
+
+import numpy as np
+
+# ─── Deck analytics ────────────────────────────────────────────────────
+# Whole-deck statistics computed on NumPy arrays of each card's schedule
+# (interval, ease factor, review count, due time) rather than card by card:
+#
+#   - cards falling due per day over the coming days (overdue ones count
+#     as due today)
+#   - the ease factor distribution
+#   - estimated current recall, from an exponential forgetting curve that
+#     SM-2 intervals are assumed to hit at TARGET_RETENTION when reviewed
+#     on time
+#   - simulated review load: every due card is reviewed on its day,
+#     recalled with the forgetting-curve probability (quality 4, ease
+#     unchanged) or lapsed (quality 2, back to a 1-day interval), then
+#     rescheduled with the same SM-2 rules as /answer-card.
+DAY = 86400.0
+TARGET_RETENTION = 0.9
+MAX_DAYS = 365
+EASE_EDGES = np.round(np.arange(1.3, 3.11, 0.1), 1)
+
+
+def _arrays(rows):
+    data = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.float64, count=4 * len(rows)).reshape(-1, 4)
+    interval, ease, reviews, due = data.T
+    return np.maximum(interval, 1), ease, reviews.astype(np.int64), due
+
+
+def _recall(elapsed_days, interval):
+    return TARGET_RETENTION ** (np.maximum(elapsed_days, 0) / interval)
+
+
+def _forecast(interval, ease, reviews, due_day, last_review, days, rng):
+    interval, reviews, due_day, last_review = interval.copy(), reviews.copy(), due_day.copy(), last_review.copy()
+    load = np.zeros(days, dtype=np.int64)
+    lapses = np.zeros(days, dtype=np.int64)
+    for day in range(days):
+        idx = np.flatnonzero(due_day <= day)
+        if not idx.size:
+            continue
+        recalled = rng.random(idx.size) < _recall(day - last_review[idx], interval[idx])
+        load[day], lapses[day] = idx.size, idx.size - recalled.sum()
+
+        failed, passed = idx[~recalled], idx[recalled]
+        reviews[failed] = 0
+        interval[failed] = 1
+        reviews[passed] += 1
+        interval[passed] = np.where(
+            reviews[passed] == 1, 1, np.where(reviews[passed] == 2, 6, np.round(interval[passed] * ease[passed]))
+        )
+        last_review[idx] = day
+        due_day[idx] = day + interval[idx]
+    return load, lapses
+
+
+def deck_stats(rows, days=30, now=None, seed=0):
+    """Statistics for a deck given (interval, ease_factor, review_count, due)
+    rows, with `due` a POSIX timestamp; see the module comment."""
+    now = now or datetime.datetime.now()
+    today = datetime.datetime.combine(now.date(), datetime.time())
+    if not rows:
+        return {"cards": 0, "start": today.date().isoformat(), "due_per_day": [0] * days, "overdue": 0,
+                "ease": {"edges": EASE_EDGES.tolist(), "counts": [0] * (len(EASE_EDGES) - 1),
+                         "mean": None, "median": None},
+                "retention": {"reviewed": 0, "mean": None, "below_80": 0},
+                "forecast": {"reviews_per_day": [0] * days, "lapses_per_day": [0] * days}}
+
+    interval, ease, reviews, due = _arrays(rows)
+    # Day offsets from local midnight today; overdue cards land on day 0.
+    due_day = np.maximum(np.floor((due - today.timestamp()) / DAY), 0).astype(np.int64)
+    last_review = (due - today.timestamp()) / DAY - interval
+
+    due_per_day = np.bincount(due_day[due_day < days], minlength=days)
+    ease_counts, _ = np.histogram(np.clip(ease, EASE_EDGES[0], EASE_EDGES[-1]), bins=EASE_EDGES)
+
+    reviewed = reviews > 0
+    elapsed = (now.timestamp() - today.timestamp()) / DAY - last_review[reviewed]
+    recall = _recall(elapsed, interval[reviewed])
+
+    load, lapses = _forecast(interval, ease, reviews, due_day, last_review, days, np.random.default_rng(seed))
+
+    return {
+        "cards": int(due.size),
+        "start": today.date().isoformat(),
+        "due_per_day": due_per_day.tolist(),
+        "overdue": int((due < now.timestamp()).sum()),
+        "ease": {
+            "edges": EASE_EDGES.tolist(),
+            "counts": ease_counts.tolist(),
+            "mean": round(float(ease.mean()), 3),
+            "median": round(float(np.median(ease)), 3),
+        },
+        "retention": {
+            "reviewed": int(reviewed.sum()),
+            "mean": round(float(recall.mean()), 4) if recall.size else None,
+            "below_80": int((recall < 0.8).sum()),
+        },
+        "forecast": {
+            "reviews_per_day": load.tolist(),
+            "lapses_per_day": lapses.tolist(),
+        },
+    }
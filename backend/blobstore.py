@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import zlib
+import hashlib
+import tempfile
+
+import metrics
+
+# ─── Content-addressed blob store ──────────────────────────────────────
+# Extracted document text and images live on disk as one file per distinct
+# payload, named by the SHA-256 of its content. Identical uploads share a
+# single blob; the study DB only keeps the hash plus size/page metadata.
+#
+#   <BLOB_DIR>/ab/abcdef....z    zlib-compressed (text)
+#   <BLOB_DIR>/ab/abcdef....     stored raw (already-compressed images)
+#
+# Text written through BlobWriter is stored as a sequence of independently
+# compressed segments (one per page or block), with a sidecar index
+#   <BLOB_DIR>/ab/abcdef....idx  JSON [[raw_offset, compressed_offset], ...]
+# recording where each segment starts, so a page range can be read without
+# decompressing the whole document. get() reads all segments back as one
+# payload; blobs without an index count as a single segment.
+BLOB_DIR = os.getenv("STUDY_BLOBS", "study_blobs")
+GC_GRACE_SECONDS = 15 * 60
+
+
+def _path(digest, compressed):
+    return os.path.join(BLOB_DIR, digest[:2], digest + (".z" if compressed else ""))
+
+
+def _index_path(digest):
+    return os.path.join(BLOB_DIR, digest[:2], digest + ".idx")
+
+
+def put(data: bytes, compress=True) -> str:
+    digest = hashlib.sha256(data).hexdigest()
+    path = _path(digest, compress)
+    if os.path.exists(path):
+        # Refresh mtime so a concurrent gc() treats the blob as live.
+        os.utime(path)
+        return digest
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(zlib.compress(data, 6) if compress else data)
+        os.replace(tmp, path)
+        metrics.BLOB_BYTES.inc(len(data), direction="write")
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    return digest
+
+
+def _decompress_segments(data):
+    out = []
+    while data:
+        d = zlib.decompressobj()
+        out.append(d.decompress(data))
+        data = d.unused_data
+    return b"".join(out)
+
+
+def get(digest) -> bytes:
+    path = _path(digest, True)
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            data = _decompress_segments(f.read())
+    else:
+        with open(_path(digest, False), "rb") as f:
+            data = f.read()
+    metrics.BLOB_BYTES.inc(len(data), direction="read")
+    return data
+
+
+def touch(digest) -> bool:
+    """Refreshes a blob's mtime (and its segment index's) so gc() keeps it
+    for another grace period. Returns False if the blob does not exist."""
+    for compressed in (True, False):
+        path = _path(digest, compressed)
+        if os.path.exists(path):
+            os.utime(path)
+            if compressed and os.path.exists(_index_path(digest)):
+                os.utime(_index_path(digest))
+            return True
+    return False
+
+
+def put_text(text: str) -> str:
+    return put(text.encode("utf-8"))
+
+
+def get_text(digest) -> str:
+    return get(digest).decode("utf-8")
+
+
+def segments(digest):
+    """[raw_offset, compressed_offset] for each stored segment of a text blob."""
+    try:
+        with open(_index_path(digest)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return [[0, 0]]
+
+
+def read_segments(digest, first, last=None) -> str:
+    """Text of segments first..last (0-based, inclusive) of a text blob."""
+    index = segments(digest)
+    last = first if last is None else last
+    if not 0 <= first <= last < len(index):
+        raise IndexError("segment range out of bounds")
+    start = index[first][1]
+    with open(_path(digest, True), "rb") as f:
+        f.seek(start)
+        data = f.read() if last + 1 == len(index) else f.read(index[last + 1][1] - start)
+    data = _decompress_segments(data)
+    metrics.BLOB_BYTES.inc(len(data), direction="read")
+    return data.decode("utf-8")
+
+
+def iter_segments(digest):
+    """Yields a text blob one stored segment at a time."""
+    # One sequential pass over the file, reading the index once.
+    index = segments(digest)
+    with open(_path(digest, True), "rb") as f:
+        for i in range(len(index)):
+            data = f.read() if i + 1 == len(index) else f.read(index[i + 1][1] - index[i][1])
+            data = _decompress_segments(data)
+            metrics.BLOB_BYTES.inc(len(data), direction="read")
+            yield data.decode("utf-8")
+
+
+class BlobWriter:
+    """Streams a text payload into the store one segment at a time, so the
+    whole document never has to be held in memory.
+
+    finish() returns (digest, size, segments), where segments is a list of
+    [raw_offset, compressed_offset] pairs marking where each segment starts.
+    """
+
+    def __init__(self):
+        os.makedirs(BLOB_DIR, exist_ok=True)
+        fd, self._tmp = tempfile.mkstemp(dir=BLOB_DIR, prefix=".tmp-")
+        self._file = os.fdopen(fd, "wb")
+        self._hash = hashlib.sha256()
+        self._raw = 0
+        self._compressed = 0
+        self.segments = []
+
+    def write_segment(self, text: str):
+        data = text.encode("utf-8")
+        packed = zlib.compress(data, 6)
+        self.segments.append([self._raw, self._compressed])
+        self._file.write(packed)
+        self._hash.update(data)
+        self._raw += len(data)
+        self._compressed += len(packed)
+
+    def finish(self):
+        self._file.close()
+        digest = self._hash.hexdigest()
+        path, index_path = _path(digest, True), _index_path(digest)
+        if os.path.exists(path) and os.path.exists(index_path):
+            # Same content already stored with its own segment index; keep it.
+            os.unlink(self._tmp)
+            os.utime(path)
+            os.utime(index_path)
+            return digest, self._raw, segments(digest)
+
+        # Publish the blob before its index: a reader in between just sees an
+        # unindexed (single-segment) blob with identical content.
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(self._tmp, path)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(self.segments, f)
+        os.replace(tmp, index_path)
+        return digest, self._raw, self.segments
+
+    def abort(self):
+        self._file.close()
+        if os.path.exists(self._tmp):
+            os.unlink(self._tmp)
+
+
+def gc(live_digests):
+    """Deletes blobs not in `live_digests` that are older than the grace
+    period. A segment index goes with its blob, whatever its own age."""
+    removed = 0
+    cutoff = time.time() - GC_GRACE_SECONDS
+    if not os.path.isdir(BLOB_DIR):
+        return removed
+    for prefix in os.listdir(BLOB_DIR):
+        folder = os.path.join(BLOB_DIR, prefix)
+        if not os.path.isdir(folder):
+            continue  # a BlobWriter's temp file
+        for name in os.listdir(folder):
+            digest = name.split(".")[0]
+            path = os.path.join(folder, name)
+            if name.endswith(".idx"):
+                if os.path.exists(_path(digest, True)):
+                    continue
+            elif digest in live_digests or os.path.getmtime(path) > cutoff:
+                continue
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            removed += 1
+    return removed
@@ -0,0 +1,110 @@
+import os
+import re
+import random
+import zlib
+import hashlib
+
+# ─── Near-duplicate flashcard index ────────────────────────────────────
+# Each card's question + answer is normalized (lowercased, punctuation and
+# stopwords dropped), cut into word-pair shingles and summarized by a
+# MinHash signature. The signature is split into bands; every band hashes
+# to one row in card_bands, so two cards that agree on any band become
+# candidates with a single indexed lookup. Candidates are then confirmed
+# by exact Jaccard similarity of their shingle sets.
+#
+# With 8 bands of 4 rows, pairs above ~0.6 similarity almost always share a
+# band, while dissimilar cards rarely do. storage.add_cards() checks new
+# cards one by one and indexes each that it keeps, so a batch is also
+# deduplicated against itself.
+SHINGLE_WORDS = 2
+# Dropped before shingling, so rewordings like "the cell" / "a cell" match.
+STOPWORDS = frozenset(
+    "a an the of in on at to for and or is are was were be by with as it its this that what which".split()
+)
+BANDS = 8
+ROWS = 4
+THRESHOLD = float(os.getenv("CARD_DUP_THRESHOLD", "0.7"))
+MAX_CANDIDATES = 32
+
+# Each "permutation" is the shingle hash XORed with a fixed random mask;
+# taking min(map(mask.__xor__, ...)) keeps the signature loop in C.
+_rng = random.Random(0x5EED)
+_MASKS = [_rng.getrandbits(32) for _ in range(BANDS * ROWS)]
+
+SCHEMA = [
+    """
+    CREATE TABLE card_bands (
+        username TEXT NOT NULL,
+        course   TEXT NOT NULL,
+        band     INTEGER NOT NULL,
+        key      INTEGER NOT NULL,
+        id       INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX card_bands_by_key ON card_bands (username, course, band, key)",
+    "CREATE INDEX card_bands_by_card ON card_bands (username, course, id)",
+]
+
+
+def create_schema(conn):
+    for stmt in SCHEMA:
+        conn.execute(stmt)
+
+
+def shingles(card):
+    text = f"{card.get('question') or ''} {card.get('answer') or ''}".lower()
+    words = [w for w in re.findall(r"\w+", text) if w not in STOPWORDS]
+    if len(words) < SHINGLE_WORDS:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def _band_keys(shingle_set):
+    # CRC32 is stable across processes (unlike hash()) and cheap enough to
+    # run over every shingle of every card.
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingle_set]
+    signature = [min(map(mask.__xor__, hashes)) for mask in _MASKS]
+    return [
+        (band, int.from_bytes(
+            hashlib.blake2b(repr(signature[band * ROWS:(band + 1) * ROWS]).encode(), digest_size=8).digest(),
+            "big", signed=True,
+        ))
+        for band in range(BANDS)
+    ]
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def index(conn, username, course, card):
+    conn.executemany(
+        "INSERT INTO card_bands (username, course, band, key, id) VALUES (?, ?, ?, ?, ?)",
+        [(username, course, band, key, card["id"]) for band, key in _band_keys(shingles(card))],
+    )
+
+
+def find_duplicate(conn, username, course, card, load_cards):
+    """Id of an indexed card in the course that near-duplicates `card`, or None.
+
+    `load_cards(ids)` returns {id: card dict} for the exact comparison. Only
+    the MAX_CANDIDATES cards sharing the most bands are compared, which
+    bounds the work on decks full of similar cards.
+    """
+    own = shingles(card)
+    keys = _band_keys(own)
+    # One exact index lookup per band; a single IN (...) over all bands
+    # makes SQLite scan the course's whole band list instead.
+    lookup = "SELECT id FROM card_bands WHERE username = ? AND course = ? AND band = ? AND key = ?"
+    rows = conn.execute(
+        f"SELECT id FROM ({' UNION ALL '.join([lookup] * len(keys))}) GROUP BY id ORDER BY COUNT(*) DESC LIMIT ?",
+        [v for band, key in keys for v in (username, course, band, key)] + [MAX_CANDIDATES],
+    ).fetchall()
+    if not rows:
+        return None
+    candidates = load_cards([r["id"] for r in rows])
+    for row in rows:
+        other = candidates.get(row["id"])
+        if other is not None and jaccard(own, shingles(other)) >= THRESHOLD:
+            return row["id"]
+    return None
@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import llm
+from retrieval import chunk_text
+
+# ─── Chunked flashcard generation ──────────────────────────────────────
+# Selected documents are split into chunks that are turned into cards
+# concurrently, so long material is covered end to end instead of being
+# truncated into one prompt. Chunks never span two documents. Near-
+# duplicate cards (within the batch and against the existing deck) are
+# removed by the storage layer; see dedupe.py.
+CHUNK_CHARS = int(os.getenv("CARD_CHUNK_CHARS", "40000"))
+CONCURRENCY = int(os.getenv("CARD_CONCURRENCY", "4"))
+# Total characters of material turned into cards per request.
+MAX_CHARS = int(os.getenv("CARD_MAX_CHARS", "950000"))
+SYSTEM_PROMPT = "You generate flashcards in JSON."
+
+
+def system_prompt(instructions=""):
+    return llm.system_prompt(SYSTEM_PROMPT, instructions)
+
+
+def _prompt(text):
+    return (
+        "You are a flashcard generator for spaced repetition learning.\n"
+        "Extract simple and clear flashcards from the following material, suitable for students to study."
+        "Return a JSON array of objects with 'question' and 'answer' fields.\n\n"
+        + text
+    )
+
+
+def generate_cards(texts, complete, concurrency=CONCURRENCY):
+    """Question/answer dicts for the given document texts, in document order.
+
+    Up to MAX_CHARS of the texts are cut into chunks; `complete` is called
+    once per chunk, at most `concurrency` at a time, with a prompt asking
+    for that chunk's cards.
+    """
+    chunks, budget = [], MAX_CHARS
+    for text in texts:
+        text = text[:budget]
+        budget -= len(text)
+        chunks.extend(chunk_text(text, CHUNK_CHARS, 0))
+    if not chunks:
+        return []
+
+    with ThreadPoolExecutor(max_workers=max(1, min(len(chunks), concurrency))) as pool:
+        batches = pool.map(lambda chunk: llm.parse_json_array(complete(_prompt(chunk))), chunks)
+        return [card for batch in batches for card in batch]
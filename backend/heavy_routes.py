@@ -0,0 +1,346 @@
+import os
+import json
+import datetime
+import pathlib
+import functools
+
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from werkzeug.exceptions import HTTPException
+
+from helpers import UPLOAD_EXTENSIONS, spool_upload
+import storage
+import llm_cache
+import jobs
+import summarizer
+import flashcards
+import quizzes
+import metrics
+import llm
+import admission
+import warm_pool
+
+# ─── Heavy routes ──────────────────────────────────────────────────────
+# Uploads and everything that calls the model or crunches a whole deck.
+# The libraries behind them (openai, PyMuPDF, Pillow, NumPy) are still
+# imported on first use, not when this blueprint is registered.
+bp = Blueprint("heavy", __name__)
+SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+
+# ─── LLM calls ─────────────────────────────────────────────────────────
+def _complete(model, system_prompt, prompt, bypass_cache=False, endpoint=None, validate=None):
+    # Generation results are cached on disk (see llm_cache.py); pass
+    # "no_cache": true in a request body to force a fresh completion.
+    # Replies the caller will parse pass `validate` so that a malformed one
+    # is never cached. Timeouts, retries and per-model concurrency live in
+    # llm.py. Callers that fan out to a thread pool pass the request's
+    # endpoint along.
+    return llm_cache.cached_call(
+        model, system_prompt, prompt, lambda: llm.complete(model, system_prompt, prompt, endpoint),
+        bypass=bypass_cache, validate=validate,
+    )
+
+def _complete_stream(model, system_prompt, prompt, bypass_cache=False, use_cache=True):
+    # Yields the completion as it arrives. A cache hit is replayed as a
+    # single piece; a fresh stream is cached once it completes.
+    key = llm_cache.make_key(model, system_prompt, prompt)
+    use_cache = use_cache and llm_cache.ENABLED
+    if use_cache and not bypass_cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    parts = []
+    for piece in llm.stream(model, system_prompt, prompt):
+        parts.append(piece)
+        yield piece
+    if use_cache:
+        llm_cache.put(key, model, "".join(parts).strip())
+
+@bp.errorhandler(llm.Busy)
+def _llm_busy(e):
+    return jsonify(error=str(e)), 503, {"Retry-After": "5"}
+
+@bp.errorhandler(admission.Rejected)
+def _not_admitted(e):
+    return jsonify(error=str(e)), e.status, {"Retry-After": str(e.retry_after)}
+
+def _admitted(view):
+    # Per-user rate limit and fair queueing for LLM-backed endpoints (see
+    # admission.py). The slot is held until the response is finished,
+    # which for a stream is when it has been fully sent or dropped. A
+    # request the view rejects as invalid (4xx) gets its token back, so
+    # malformed requests do not use up the user's rate limit.
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        username = request.headers.get("Username")
+        if not username:
+            return view(*args, **kwargs)
+        release = admission.enter(username, metrics.endpoint())
+        try:
+            response = current_app.make_response(view(*args, **kwargs))
+        except HTTPException as e:
+            release(refund=400 <= (e.code or 500) < 500)
+            raise
+        except BaseException:
+            release()
+            raise
+        if response.is_streamed:
+            response.call_on_close(release)
+        else:
+            release(refund=400 <= response.status_code < 500)
+        return response
+    return wrapper
+
+def _sse(payload, event=None):
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(payload)}\n\n"
+
+def _sse_response(pieces, field, on_done=None):
+    # Server-sent events: one {"delta": ...} message per piece, then a
+    # "done" event carrying the full text under `field` (after on_done has
+    # persisted it), or an "error" event if the upstream call fails.
+    def events():
+        parts = []
+        try:
+            for piece in pieces:
+                parts.append(piece)
+                yield _sse({"delta": piece})
+            text = "".join(parts).strip()
+            if on_done:
+                on_done(text)
+        except Exception as e:
+            current_app.logger.exception("Streaming completion failed")
+            yield _sse({"error": str(e)}, event="error")
+            return
+        yield _sse({field: text}, event="done")
+
+    # stream_with_context keeps the request bound while the body streams,
+    # so the upstream call is still attributed to its endpoint.
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# ─── 1) UPLOAD ─────────────────────────────────────────────────────────
+@bp.post("/upload")
+def upload():
+    uploaded_files = request.files.getlist("files")
+    course = request.form.get("course")
+    username = request.headers.get("Username")
+    if not uploaded_files or not course or not username:
+        return jsonify(error="Missing files, course, or username"), 400
+
+    # Spool each upload to its own temp file (copied in chunks, never read
+    # into memory whole) and hash it on the way; extraction then streams
+    # from disk, and is skipped for bytes that were extracted before.
+    uploads = []
+    for f in uploaded_files:
+        name = pathlib.Path(f.filename).name
+        if name.lower().endswith(UPLOAD_EXTENSIONS):
+            path, source = spool_upload(f.stream, suffix=pathlib.Path(name).suffix, dir=SPOOL_DIR)
+            uploads.append((name, path, source))
+
+    # Extraction runs in the background process pool (see jobs.py); poll
+    # /upload-status/<job_id> for progress.
+    job_id = jobs.submit(username, course, uploads)
+    if job_id is None:
+        for _, path, _ in uploads:
+            os.unlink(path)
+        return jsonify(error="Too many uploads in progress, try again shortly"), 503, {"Retry-After": "5"}
+    return jsonify(message=f"{len(uploads)} files queued.", job_id=job_id), 202
+
+# ─── 4) SUMMARIZE ──────────────────────────────────────────────────────
+@bp.post("/summarize")
+@_admitted
+def summarize():
+    data = request.get_json(force=True)
+    selected = data.get("filenames", [])
+    course = data.get("course")
+    username = request.headers.get("Username")
+    if not selected or not course or not username:
+        return jsonify(error="Missing files, course, or username"), 400
+
+    # Read optional model override and instructions
+    req_model = (data.get("model") or "").strip()
+    model_to_use = req_model if req_model else current_app.config["DEFAULT_MODEL"]
+    instructions = (data.get("instructions") or "").strip()
+
+    files = storage.get_files(username, course, selected)
+    if not files:
+        return jsonify(error="No matching files"), 404
+
+    docs = [(f["name"], storage.file_text(f)) for f in files]
+
+    # Build a system prompt, appending any user-provided instructions
+    system_prompt = llm.system_prompt("You are a helpful study assistant.", instructions)
+    bypass_cache = bool(data.get("no_cache"))
+    save_summary = lambda text: storage.add_summary(username, course, text)
+
+    # "map_reduce" summarizes documents (and chunks of long ones) in
+    # parallel; very large selections use it even when not requested.
+    mode = data.get("mode")
+    if not mode:
+        total_chars = sum(len(text) for _, text in docs)
+        mode = "map_reduce" if total_chars > summarizer.SINGLE_PASS_CHARS else "single"
+    if mode == "map_reduce":
+        endpoint = metrics.endpoint()
+        sections = summarizer.summarize_documents(
+            docs, lambda p: _complete(model_to_use, system_prompt, p, bypass_cache=bypass_cache, endpoint=endpoint)
+        )
+        if data.get("stream"):
+            return _sse_response((section + "\n\n" for section in sections), "summary", on_done=save_summary)
+        summary = "\n\n".join(sections)
+        save_summary(summary)
+        return jsonify(summary=summary)
+
+    prompt_parts = []
+    for i, (name, text) in enumerate(docs, start=1):
+        prompt_parts.append(f"---\nDOCUMENT #{i} FILENAME: {name}\n\n{text}\n")
+
+    prompt = (
+        "You are a study assistant. For each document below, first invent a clear, concise title based on its content, "
+        "then write a brief summary. Format **exactly** like this:\n\n"
+        "**<Title for Document 1>**\nSummary of Document 1...\n\n"
+        "**<Title for Document 2>**\nSummary of Document 2...\n\n"
+        + "\n".join(prompt_parts)
+    )
+
+    if data.get("stream"):
+        # Opt-in SSE mode; the summary is saved once the stream completes.
+        return _sse_response(
+            _complete_stream(model_to_use, system_prompt, prompt, bypass_cache=bypass_cache),
+            "summary",
+            on_done=save_summary,
+        )
+
+    summary = _complete(model_to_use, system_prompt, prompt, bypass_cache=bypass_cache)
+    save_summary(summary)
+    return jsonify(summary=summary)
+
+# ─── 5) GENERATE FLASHCARDS ────────────────────────────────────────────
+@bp.post("/generate-cards")
+@_admitted
+def generate_cards():
+    data = request.get_json(force=True)
+    selected_files = data.get("filenames", [])
+    course = data.get("course")
+    username = request.headers.get("Username")
+    if not selected_files or not course or not username:
+        return jsonify(error="Missing files, course, or username"), 400
+    
+    req_model = (data.get("model") or "").strip()
+    model_to_use = req_model if req_model else current_app.config["DEFAULT_MODEL"]
+    instructions = (data.get("instructions") or "").strip()
+
+    files = storage.get_files(username, course, selected_files)
+    if not files:
+        return jsonify(error="No matching files found"), 404
+
+    system_prompt = flashcards.system_prompt(instructions)
+    bypass = bool(data.get("no_cache"))
+    # A batch pre-generated in the background (see warm_pool.py) is used
+    # when one is ready; otherwise chunks are turned into cards in parallel
+    # (see flashcards.py). Either way near-duplicates of each other and of
+    # the existing deck are dropped.
+    cards = None if bypass else warm_pool.take("cards", username, course, files, model_to_use, instructions)
+    if cards is None:
+        endpoint = metrics.endpoint()
+        cards = flashcards.generate_cards(
+            [storage.file_text(f) for f in files],
+            lambda prompt: _complete(model_to_use, system_prompt, prompt, bypass_cache=bypass, endpoint=endpoint,
+                                     validate=llm.parse_json_array),
+        )
+
+    for c in cards:
+        c.update(
+            review_count=0,
+            interval=1,
+            ease_factor=2.5,
+            next_review=datetime.datetime.now().isoformat()
+        )
+    generated = len(cards)
+    cards = storage.add_cards(username, course, cards, skip_duplicates=True)
+
+    return jsonify(
+        message=f"{len(cards)} cards generated.", cards=cards, duplicates_skipped=generated - len(cards)
+    )
+
+# ─── 8) GENERATE QUIZ ──────────────────────────────────────────────────
+@bp.post("/generate-quiz")
+@_admitted
+def generate_quiz():
+    data = request.get_json(force=True)
+    selected_files = data.get("filenames", [])
+    course = data.get("course")
+    username = request.headers.get("Username")
+    if not selected_files or not course or not username:
+        return jsonify(error="Missing files, course, or username"), 400
+    
+    # Read optional model override and instructions
+    req_model = (data.get("model") or "").strip()
+    model_to_use = req_model if req_model else current_app.config["DEFAULT_MODEL"]
+    instructions = (data.get("instructions") or "").strip()
+    
+    files = storage.get_files(username, course, selected_files)
+    if not files:
+        return jsonify(error="No matching files found"), 404
+    
+    # A quiz pre-generated in the background (see warm_pool.py) is handed
+    # out straight away when one is ready for this selection.
+    bypass = bool(data.get("no_cache"))
+    questions = None if bypass else warm_pool.take("quiz", username, course, files, model_to_use, instructions)
+    if questions is None:
+        questions = quizzes.generate_quiz(
+            [storage.file_text(f) for f in files],
+            lambda prompt: _complete(model_to_use, quizzes.system_prompt(instructions), prompt, bypass_cache=bypass,
+                                     validate=llm.parse_json_array),
+        )
+
+    storage.add_quiz(username, course, datetime.datetime.now().isoformat(), selected_files, questions)
+
+    return jsonify(questions=questions)
+
+# ─── 12) ASK ────────────────────────────────────────────────────────────
+@bp.post("/ask")
+@_admitted
+def ask():
+    data = request.get_json(force=True)
+    query = data.get("query")
+    course = data.get("course")
+    username = request.headers.get("Username")
+
+
+    if not query or not course or not username:
+        return jsonify(error="Missing 'query', 'course', or 'username'"), 400
+
+    # Course-specific context: only the chunks most relevant to the question,
+    # ranked by the course's BM25 index and capped at ASK_CONTEXT_CHARS.
+    context = "\n\n".join(storage.search_context(username, course, query))
+
+    prompt = (
+            "You are a helpful tutor. Use the study material below to answer the student's question.\n\n"
+            + context
+            + "\n\nQuestion: "
+            + query
+        )
+
+    model = current_app.config["DEFAULT_MODEL"]
+    if data.get("stream"):
+        return _sse_response(
+            _complete_stream(model, "You are a helpful tutor.", prompt, use_cache=False), "answer"
+        )
+
+    answer = llm.complete(model, "You are a helpful tutor.", prompt)
+    return jsonify(answer=answer)
+
+# ─── 15) DECK ANALYTICS ────────────────────────────────────────────────
+@bp.get("/deck-stats")
+def deck_stats():
+    import analytics  # NumPy: loaded by the first request that needs it
+
+    course = request.args.get("course")
+    username = request.headers.get("Username")
+    if not course or not username:
+        return jsonify(error="Missing course or username"), 400
+    days = min(max(request.args.get("days", 30, type=int), 1), analytics.MAX_DAYS)
+
+    return jsonify(analytics.deck_stats(storage.card_schedules(username, course), days))
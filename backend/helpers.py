@@ -1,27 +1,140 @@
-import io, fitz, docx, base64
-from PIL import Image
+import io, os, json, codecs, hashlib, importlib, tempfile, threading, zipfile
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
 
-def pdf_to_text(file_bytes: bytes) -> str:
-    pdf = fitz.open(stream=file_bytes, filetype="pdf")
-    return "".join(page.get_text() for page in pdf)
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process locking only
+    fcntl = None
 
-def docx_to_text(file_bytes: bytes) -> str:
-    buf = io.BytesIO(file_bytes)
-    doc = docx.Document(buf)
-    return "\n".join(p.text for p in doc.paragraphs)
+import blobstore
 
-def image_to_base64(file_bytes: bytes) -> str:
-    img = Image.open(io.BytesIO(file_bytes))
-    with io.BytesIO() as out:
-        img.save(out, format="PNG")
-        return base64.b64encode(out.getvalue()).decode()
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp")
+UPLOAD_EXTENSIONS = (".pdf", ".txt", ".md", ".docx") + IMAGE_EXTENSIONS
 
-# user.json management
-import os
-import json
-import hashlib
+# PyMuPDF and Pillow are imported where they are used, not here: web
+# workers that never extract a file (and storage.py, which needs
+# IMAGE_EXTENSIONS) should not pay for loading them. DOCX files are read
+# straight from their XML (see _iter_docx_paragraphs).
+EXTRACTORS = ("fitz", "PIL.Image")
+
+def load_extractors():
+    """Imports the extraction libraries up front; the upload pool's
+    preload mode (see jobs.py) runs this in each worker as it starts."""
+    for name in EXTRACTORS:
+        importlib.import_module(name)
+
+# ─── Streaming extraction ──────────────────────────────────────────────
+# Uploads are spooled to temp files and extracted a page (PDF), a batch of
+# paragraphs (DOCX) or a block (text) at a time, each piece written straight
+# to the blob store as its own segment. Peak memory is one piece, not the
+# whole document.
+SEGMENT_CHARS = 64 * 1024
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+def _iter_pdf_pages(path):
+    import fitz
+    with fitz.open(path) as pdf:
+        for page in pdf:
+            yield page.get_text()
+
+def _iter_docx_paragraphs(path):
+    # Walk word/document.xml with iterparse instead of building the whole
+    # document in memory; each paragraph is dropped once emitted.
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as xml:
+        parts = []
+        for _, el in ET.iterparse(xml, events=("end",)):
+            if el.tag == _W + "t":
+                parts.append(el.text or "")
+            elif el.tag == _W + "tab":
+                parts.append("\t")
+            elif el.tag in (_W + "br", _W + "cr"):
+                parts.append("\n")
+            elif el.tag == _W + "p":
+                yield "".join(parts)
+                parts = []
+                el.clear()
+
+def _iter_text_blocks(path):
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    with open(path, "rb") as f:
+        while block := f.read(SEGMENT_CHARS):
+            yield decoder.decode(block)
+        yield decoder.decode(b"", final=True)
+
+def _batched_paragraphs(paragraphs):
+    # Same text as "\n".join(paragraphs), emitted in ~SEGMENT_CHARS pieces.
+    batch, size, first = [], 0, True
+    for p in paragraphs:
+        batch.append(p)
+        size += len(p) + 1
+        if size >= SEGMENT_CHARS:
+            yield ("" if first else "\n") + "\n".join(batch)
+            batch, size, first = [], 0, False
+    if batch:
+        yield ("" if first else "\n") + "\n".join(batch)
 
+def spool_upload(file, suffix="", dir=None) -> tuple[str, str]:
+    """Copies an uploaded file to a temp file in chunks, hashing the raw
+    bytes on the way. Returns (path, sha256 hex digest)."""
+    digest = hashlib.sha256()
+    fd, path = tempfile.mkstemp(prefix="wisebud-upload-", suffix=suffix, dir=dir)
+    with os.fdopen(fd, "wb") as out:
+        while block := file.read(SEGMENT_CHARS):
+            digest.update(block)
+            out.write(block)
+    return path, digest.hexdigest()
+
+def extract_upload(name: str, path: str) -> dict:
+    """Extracts one spooled upload into the blob store and returns its file
+    metadata entry. Runs in the upload process pool (see jobs.py)."""
+    lower = name.lower()
+    if lower.endswith(IMAGE_EXTENSIONS):
+        from PIL import Image
+        with Image.open(path) as img, io.BytesIO() as out:
+            img.save(out, format="PNG")
+            payload = out.getvalue()
+        return { "name": name, "kind": "image", "blob": blobstore.put(payload, compress=False),
+                 "size": len(payload), "pages": None }
+
+    if lower.endswith(".pdf"):
+        pieces = _iter_pdf_pages(path)
+    elif lower.endswith(".docx"):
+        pieces = _batched_paragraphs(_iter_docx_paragraphs(path))
+    else:
+        pieces = _iter_text_blocks(path)
+
+    writer = blobstore.BlobWriter()
+    try:
+        count = 0
+        for piece in pieces:
+            if piece or lower.endswith(".pdf"):
+                writer.write_segment(piece)
+                count += 1
+        digest, size, _ = writer.finish()
+    except BaseException:
+        writer.abort()
+        raise
+    return { "name": name, "kind": "text", "blob": digest, "size": size,
+             "pages": count if lower.endswith(".pdf") else None }
+
+# user.json management
 USERS_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "users.json"))
+_users_thread_lock = threading.Lock()
+
+@contextmanager
+def _users_lock():
+    # Serializes read-modify-write of users.json across threads and worker processes.
+    with _users_thread_lock:
+        if fcntl is None:
+            yield
+            return
+        with open(USERS_FILE + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
 
 def _load_users():
     if not os.path.exists(USERS_FILE):
@@ -29,9 +142,22 @@ def _load_users():
     with open(USERS_FILE, "r") as f:
         return json.load(f)
 
+def _atomic_write_json(path, data):
+    # Write to a sibling temp file and rename over the target, so readers
+    # never see a half-written file and a crash leaves the old copy intact.
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path) + ".")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
 def _save_users(data):
-    with open(USERS_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+    _atomic_write_json(USERS_FILE, data)
 
 def _hash_password(password):
     return hashlib.sha256(password.encode()).hexdigest()
@@ -0,0 +1,160 @@
+import os
+import time
+import uuid
+import threading
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import metrics
+import storage
+from helpers import EXTRACTORS, extract_upload, load_extractors
+
+# ─── Background upload extraction ──────────────────────────────────────
+# /upload hands each file to a bounded process pool and returns a job id
+# straight away. Files are extracted in parallel across cores; each one is
+# recorded in storage (and so shows up in /list-files) as soon as it is
+# done, and job progress is tracked in the jobs table.
+#
+# Workers are never forked from the web worker itself: it runs request,
+# warm-pool and compaction threads, and a child forked while one of them
+# held a lock (the metrics registry's, logging's) would hang on it. They
+# are forked from a small fork server instead, or spawned where there is
+# none (UPLOAD_WORKER_START overrides). The pool starts with the first
+# upload and each worker imports the extraction libraries on its first
+# file; UPLOAD_PRELOAD=1 starts it with the app and imports
+# helpers.EXTRACTORS up front, once in the fork server.
+WORKERS = int(os.getenv("UPLOAD_WORKERS", str(os.cpu_count() or 2)))
+MAX_PENDING = int(os.getenv("UPLOAD_MAX_PENDING", "64"))
+START_METHOD = os.getenv("UPLOAD_WORKER_START") or (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+PRELOAD = os.getenv("UPLOAD_PRELOAD", "0") == "1"
+
+_executor = None
+_lock = threading.Lock()
+_pending = 0
+
+
+def _pool():
+    global _executor
+    with _lock:
+        if _executor is None:
+            context = multiprocessing.get_context(START_METHOD)
+            if START_METHOD == "forkserver":
+                # Only takes effect when the fork server first starts.
+                context.set_forkserver_preload([__name__, *(EXTRACTORS if PRELOAD else ())])
+            _executor = ProcessPoolExecutor(
+                max_workers=WORKERS, mp_context=context, initializer=load_extractors if PRELOAD else None
+            )
+        return _executor
+
+
+def start():
+    """Starts the extraction workers now instead of on the first upload,
+    if UPLOAD_PRELOAD is set."""
+    if not PRELOAD:
+        return
+    pool = _pool()
+    for _ in range(WORKERS):
+        pool.submit(load_extractors)
+
+
+def _reset_pool(pool):
+    # A crashed child (e.g. a malformed PDF taking down the parser) breaks
+    # the whole executor; start a fresh one for later uploads. Every future
+    # of the broken pool reports it, so only the first report replaces it:
+    # later ones must not shut down the fresh pool.
+    global _executor
+    with _lock:
+        if _executor is not pool:
+            return
+        _executor = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def pending():
+    """Files queued or being extracted in this process."""
+    return _pending
+
+
+def _extract(name, path):
+    # Runs in a pool worker; the timing travels back with the result so it
+    # lands in the parent's metrics, which are the ones /metrics serves.
+    start = time.perf_counter()
+    entry = extract_upload(name, path)
+    return entry, time.perf_counter() - start
+
+
+def submit(username, course, uploads):
+    """Queues (name, spooled temp path, sha256 of the raw bytes) uploads for
+    extraction. Files whose bytes were extracted before are recorded right
+    away from the stored result instead. The temp files are removed once
+    each file is done.
+
+    Returns the job id, or None if the pending-file limit would be exceeded.
+    """
+    global _pending
+    # Looked up per upload, not per name: one request may carry two files
+    # with the same name and different content.
+    known = [storage.find_upload(source, name) for name, _, source in uploads]
+    fresh = [u for u, entry in zip(uploads, known) if entry is None]
+    with _lock:
+        if _pending + len(fresh) > MAX_PENDING:
+            return None
+        _pending += len(fresh)
+
+    job_id = uuid.uuid4().hex
+    submitted = 0
+    try:
+        storage.create_job(job_id, username, course, len(uploads))
+        for (name, path, source), entry in zip(uploads, known):
+            if entry is not None:
+                try:
+                    storage.add_files(username, course, [entry])
+                    storage.finish_job_file(job_id, name)
+                finally:
+                    os.unlink(path)
+        for name, path, source in fresh:
+            pool = _pool()
+            try:
+                future = pool.submit(_extract, name, path)
+            except BrokenProcessPool:
+                _reset_pool(pool)
+                pool = _pool()
+                future = pool.submit(_extract, name, path)
+            submitted += 1
+            future.add_done_callback(functools.partial(_finish, pool, job_id, username, course, name, path, source))
+    except BaseException:
+        # Files handed to the pool are cleaned up by _finish(); give back
+        # the slots and spool files of the rest.
+        with _lock:
+            _pending -= len(fresh) - submitted
+        handed = {path for _, path, _ in fresh[:submitted]}
+        for _, path, _ in uploads:
+            if path not in handed and os.path.exists(path):
+                os.unlink(path)
+        raise
+    return job_id
+
+
+def _finish(pool, job_id, username, course, name, path, source, future):
+    global _pending
+    try:
+        entry, seconds = future.result()
+        kind = os.path.splitext(name)[1].lower().lstrip(".") or "txt"
+        metrics.EXTRACT_SECONDS.observe(seconds, type=kind)
+        metrics.EXTRACT_BYTES.inc(entry["size"], type=kind)
+        storage.add_files(username, course, [dict(entry, source=source)])
+        storage.finish_job_file(job_id, name)
+    except BrokenProcessPool:
+        _reset_pool(pool)
+        storage.finish_job_file(job_id, name, "Extraction worker crashed")
+    except Exception as e:
+        storage.finish_job_file(job_id, name, str(e) or type(e).__name__)
+    finally:
+        if os.path.exists(path):
+            os.unlink(path)
+        with _lock:
+            _pending -= 1
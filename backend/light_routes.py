@@ -0,0 +1,380 @@
+import datetime
+
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from werkzeug.utils import secure_filename
+
+from helpers import _load_users, _save_users, _users_lock, _hash_password
+import storage
+import llm_cache
+import jobs
+import metrics
+import transfer
+import admission
+
+# ─── Light routes ──────────────────────────────────────────────────────
+# Everything that only reads and writes the study store: files, review
+# sessions, todos, accounts, export/import and the stats endpoints. None
+# of it needs the LLM SDK or the document parsers, so a replica serving
+# only this blueprint (WISEBUD_BLUEPRINTS=light, see app.py) never loads
+# them.
+bp = Blueprint("light", __name__)
+
+# ─── 1b) UPLOAD STATUS ─────────────────────────────────────────────────
+# Progress of an /upload job (the upload itself is in heavy_routes.py).
+@bp.get("/upload-status/<job_id>")
+def upload_status(job_id):
+    username = request.headers.get("Username")
+    if not username:
+        return jsonify(error="Missing username"), 400
+
+    job = storage.get_job(username, job_id)
+    if job is None:
+        return jsonify(error="Job not found"), 404
+    job["total_files"] = storage.count_files(username, job["course"])
+    return jsonify(job)
+
+# ─── 2) LIST FILES ─────────────────────────────────────────────────────
+@bp.get("/list-files")
+def list_files():
+    course = request.args.get("course")
+    username = request.headers.get("Username")
+    if not course or not username:
+        return jsonify(error="Missing course or username"), 400
+
+    return jsonify(files=storage.list_file_names(username, course))
+
+# ─── 2b) FILE PAGES ────────────────────────────────────────────────────
+@bp.get("/file-pages")
+def file_pages():
+    course = request.args.get("course")
+    filename = request.args.get("filename")
+    username = request.headers.get("Username")
+    if not course or not filename or not username:
+        return jsonify(error="Missing course, filename, or username"), 400
+    try:
+        first = int(request.args.get("start", 1))
+        last = int(request.args.get("end", first))
+    except ValueError:
+        return jsonify(error="'start' and 'end' must be page numbers"), 400
+
+    entry = next(iter(storage.get_files(username, course, [filename])), None)
+    if entry is None or entry["kind"] != "text":
+        return jsonify(error="File not found"), 404
+    try:
+        text = storage.read_pages(entry, first, last)
+    except IndexError:
+        return jsonify(error="Page range out of bounds"), 400
+    return jsonify(filename=filename, start=first, end=last, text=text)
+
+# ─── 3) DELETE FILE ─────────────────────────────────────────────────────
+@bp.post("/delete-file")
+def delete_file():
+    data = request.get_json(force=True)
+    course = data.get("course")
+    filename = data.get("filename")
+    username = request.headers.get("Username")
+
+    if not course or not filename or not username:
+        return jsonify(error="Missing 'course', 'filename', or 'username'"), 400
+
+    removed_count = storage.delete_files(username, course, filename)
+    if removed_count is None:
+        return jsonify(message="Course not found."), 404
+
+    return jsonify(message=f"Removed {removed_count} entries with name '{filename}'.")
+
+# ─── 6) GET CARD ───────────────────────────────────────────────────────
+@bp.get("/get-card")
+def get_card():
+    course = request.args.get("course")
+    username = request.headers.get("Username")
+    if not course or not username:
+        return jsonify(error="Missing course or username"), 400
+
+    # The earliest-scheduled card is the most overdue one if any are due,
+    # otherwise the next to come due; both are one seek on the due index.
+    next_card = storage.next_due_card(username, course)
+    if next_card is None:
+        return jsonify(message="No cards available"), 404
+
+    next_card.setdefault("type", "basic")
+    return jsonify(next_card)
+
+
+
+# ─── 7) ANSWER CARD ────────────────────────────────────────────────────
+def _apply_sm2(card, quality, answered_at=None):
+    """Applies one SM‑2 style grade to `card` in place, scheduling the next
+    review relative to `answered_at` (default: now)."""
+    if quality < 3:
+        # low quality: reset the review count and interval
+        card["review_count"] = 0
+        card["interval"] = 1
+    else:
+        card["review_count"] += 1
+        # Update ease factor (SM‑2 formula with lower bound 1.3)
+        new_ef = card["ease_factor"] + (
+            0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+        )
+        card["ease_factor"] = max(1.3, new_ef)
+        # Set interval depending on review count
+        if card["review_count"] == 1:
+            card["interval"] = 1
+        elif card["review_count"] == 2:
+            card["interval"] = 6
+        else:
+            card["interval"] = round(card["interval"] * card["ease_factor"])
+
+    # Schedule next review date
+    card["next_review"] = (
+        (answered_at or datetime.datetime.now()) + datetime.timedelta(days=card["interval"])
+    ).isoformat()
+    return card
+
+def _last_review(card):
+    # When the card's current schedule was set: its next review minus its
+    # interval (the same estimate analytics.py uses).
+    try:
+        return datetime.datetime.fromisoformat(card["next_review"]) - datetime.timedelta(days=card["interval"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def _answered_at(value, card=None):
+    # Client timestamps (ISO 8601, e.g. from Date.toISOString()) are
+    # converted to naive local time like the stored schedule and clamped:
+    # never in the future, never older than REVIEW_WINDOW, and never before
+    # `card` was last scheduled, so a grade flushed late (say from a
+    # background tab) cannot reschedule from a time before a newer grade.
+    now = datetime.datetime.now()
+    try:
+        when = datetime.datetime.fromisoformat(value) if value else now
+    except (TypeError, ValueError):
+        return now
+    if when.tzinfo is not None:
+        when = when.astimezone().replace(tzinfo=None)
+    earliest = now - REVIEW_WINDOW
+    if card is not None:
+        earliest = max(earliest, _last_review(card) or earliest)
+    return min(max(when, earliest), now)
+
+@bp.post("/answer-card")
+def answer_card():
+    data = request.get_json(force=True)
+    course = data.get("course")
+    card_id = data.get("cardId")
+    username = request.headers.get("Username")
+
+    # Support both 'quality' (preferred) and 'correct' (legacy) inputs
+    quality = data.get("quality")
+    if quality is None:
+        correct = data.get("correct")
+        if correct is None:
+            return jsonify(error="Missing 'quality' or 'correct'"), 400
+        # map boolean correct/incorrect to a 0–5 quality score
+        quality = 5 if correct else 2
+
+    if course is None or card_id is None or username is None:
+        return jsonify(error="Missing 'course', 'cardId', or 'username'"), 400
+
+    # Read and write the card under one write lock so concurrent grades
+    # of the same card cannot overwrite each other.
+    with storage.transaction():
+        card = storage.get_card(username, course, card_id)
+        if card is None:
+            return jsonify(error="Card not found"), 404
+
+        _apply_sm2(card, quality)
+        storage.update_card(username, course, card)
+    return jsonify(message="Card updated.")
+
+# ─── 7b) REVIEW SESSION (BATCHED) ──────────────────────────────────────
+# The flashcard page prefetches the next cards in review order and sends
+# grades back in batches, so a session costs a few requests instead of
+# two per card.
+REVIEW_BATCH_MAX = 200
+# Oldest answered_at accepted in a batch; earlier ones count from then.
+REVIEW_WINDOW = datetime.timedelta(hours=24)
+
+@bp.get("/get-cards")
+def get_cards():
+    course = request.args.get("course")
+    username = request.headers.get("Username")
+    if not course or not username:
+        return jsonify(error="Missing course or username"), 400
+    limit = min(max(request.args.get("limit", 20, type=int), 1), REVIEW_BATCH_MAX)
+
+    cards = storage.due_cards(username, course, limit)
+    for card in cards:
+        card.setdefault("type", "basic")
+    return jsonify(cards=cards)
+
+def _card_id(value):
+    # Card ids are integers; digit strings are accepted for them. bool is
+    # an int subclass but never an id.
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+def _quality(value):
+    return isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= 5
+
+@bp.post("/answer-cards")
+def answer_cards():
+    data = request.get_json(force=True)
+    course = data.get("course")
+    grades = data.get("grades")
+    username = request.headers.get("Username")
+    if not course or not username or not isinstance(grades, list):
+        return jsonify(error="Missing 'course', 'grades', or 'username'"), 400
+    if len(grades) > REVIEW_BATCH_MAX:
+        return jsonify(error=f"At most {REVIEW_BATCH_MAX} grades per request"), 400
+    for grade in grades:
+        if not isinstance(grade, dict) or _card_id(grade.get("cardId")) is None or not _quality(grade.get("quality")):
+            return jsonify(error="Each grade needs a numeric 'cardId' and a 'quality' from 0 to 5"), 400
+    grades = [dict(grade, cardId=_card_id(grade["cardId"])) for grade in grades]
+
+    # All grades are applied under one write lock, in the order they were
+    # answered, so a card graded twice in the batch is updated twice.
+    ids = {grade["cardId"] for grade in grades}
+    with storage.transaction():
+        cards = storage.get_cards_by_id(username, course, ids)
+        for grade in sorted(grades, key=lambda grade: _answered_at(grade.get("answered_at"))):
+            card = cards.get(grade["cardId"])
+            if card is not None:
+                _apply_sm2(card, grade["quality"], _answered_at(grade.get("answered_at"), card))
+        storage.update_cards(username, course, list(cards.values()))
+
+    missing = sorted(ids - cards.keys(), key=str)
+    return jsonify(message=f"{len(cards)} cards updated.", updated=len(cards), missing=missing)
+
+
+# ─── 9) LIST TODOS ─────────────────────────────────────────────────────
+@bp.get("/list-todos")
+def list_todos():
+    username = request.headers.get("Username")
+    if not username:
+        return jsonify(error="Missing username"), 401
+
+    return jsonify(todos=storage.list_todos(username))
+
+# ─── 10) ADD TODO ──────────────────────────────────────────────────────
+@bp.post("/add-todo")
+def add_todo():
+    data = request.get_json(force=True)
+    text = data.get("text", "").strip()
+    username = request.headers.get("Username")
+    if not text or not username:
+        return jsonify(error="Missing text or username"), 400
+
+    if not storage.add_todo(username, text):
+        return jsonify(message="Todo already exists."), 200
+
+    return jsonify(message="Todo added.", todos=storage.list_todos(username))
+
+# ─── 11) REMOVE TODO ───────────────────────────────────────────────────
+@bp.post("/remove-todo")
+def remove_todo():
+    data = request.get_json(force=True)
+    text = data.get("text", "").strip()
+    username = request.headers.get("Username")
+    if not text or not username:
+        return jsonify(error="Missing text or username"), 400
+
+    if not storage.remove_todo(username, text):
+        return jsonify(error="Todo not found."), 404
+
+    return jsonify(message="Todo removed.", todos=storage.list_todos(username))
+
+# ─── 13) LLM CACHE STATS ───────────────────────────────────────────────
+@bp.get("/cache-stats")
+def cache_stats():
+    return jsonify(llm_cache.stats())
+
+# ─── 14) METRICS ───────────────────────────────────────────────────────
+# Prometheus text format. Request timings and the "X-Profile: 1"
+# Server-Timing breakdown are recorded by hooks in app.py.
+@bp.get("/metrics")
+def metrics_endpoint():
+    for stat, value in llm_cache.stats().items():
+        metrics.LLM_CACHE.set(value, stat=stat)
+    metrics.UPLOADS_PENDING.set(jobs.pending())
+    metrics.ADMISSION_QUEUED.set(admission.waiting())
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# ─── 16) EXPORT / IMPORT ───────────────────────────────────────────────
+# NDJSON bundles of a user's data (see transfer.py), streamed in both
+# directions so neither side ever holds a whole bundle in memory.
+@bp.get("/export")
+def export_data():
+    course = request.args.get("course")
+    username = request.headers.get("Username")
+    if not username:
+        return jsonify(error="Missing username"), 400
+    compress = request.args.get("gzip") in ("1", "true")
+
+    name = secure_filename("-".join(filter(None, [username, course]))) or "export"
+    name += ".ndjson.gz" if compress else ".ndjson"
+    return Response(stream_with_context(transfer.dump(username, course, compress)),
+                    mimetype="application/gzip" if compress else "application/x-ndjson",
+                    headers={"Content-Disposition": f"attachment; filename={name}"})
+
+@bp.post("/import")
+def import_data():
+    username = request.headers.get("Username")
+    if not username:
+        return jsonify(error="Missing username"), 400
+    # Bundles may be far larger than any upload; they are read line by line.
+    request.max_content_length = None
+
+    try:
+        counts = transfer.import_stream(username, request.stream, request.args.get("course"))
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify(error=f"Malformed export: {e}"), 400
+    return jsonify(imported=counts)
+
+@bp.post("/register")
+def register():
+    data = request.get_json(force=True)
+    username = data.get("username", "").strip()
+    password = data.get("password", "").strip()
+
+    if not username or not password:
+        return jsonify(error="Missing username or password"), 400
+    if not (8 <= len(password) <= 16):
+        return jsonify(error="Password must be 8–16 characters"), 400
+    if not any(c.islower() for c in password) or not any(c.isupper() for c in password):
+        return jsonify(error="Password must include both lowercase and uppercase letters"), 400
+    if not any(c.isdigit() for c in password):
+        return jsonify(error="Password must include a number"), 400
+    if not any(c in "!@#$%^&*()-_=+[]{}|;:,.<>?/`~" for c in password):
+        return jsonify(error="Password must include a special character"), 400
+
+    with _users_lock():
+        users = _load_users()
+        if username in users:
+            return jsonify(error="Username already exists"), 400
+
+        users[username] = { "password": _hash_password(password) }
+        _save_users(users)
+
+    return jsonify(message="User registered successfully")
+
+
+@bp.post("/login")
+def login():
+    data = request.get_json(force=True)
+    username = data.get("username", "").strip()
+    password = data.get("password", "").strip()
+
+    if not username or not password:
+        return jsonify(error="Missing username or password"), 400
+
+    users = _load_users()
+    hashed = _hash_password(password)
+
+    if username not in users or users[username]["password"] != hashed:
+        return jsonify(error="Invalid username or password"), 401
+
+    return jsonify(message="Login successful")
@@ -0,0 +1,178 @@
+import os
+import re
+import json
+import time
+import random
+import threading
+
+import metrics
+
+# ─── LLM gateway ───────────────────────────────────────────────────────
+# Every chat completion goes through here. One pooled client keeps
+# connections to the API alive across requests; each call has a timeout,
+# transient failures (429, 5xx, timeouts, dropped connections) are retried
+# with jittered exponential backoff, and a per-model semaphore caps how
+# many calls are in flight so a burst on one endpoint cannot trip the
+# upstream rate limit for everyone.
+#
+# The openai SDK takes a couple of seconds to import, so it is loaded by
+# the first call rather than when a worker boots.
+#
+#   LLM_CONCURRENCY=8                  default in-flight calls per model
+#   LLM_MODEL_CONCURRENCY=gpt-5=2,...  per-model overrides
+TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "8"))
+MODEL_CONCURRENCY = {
+    name.strip(): int(limit)
+    for name, _, limit in (
+        item.partition("=") for item in os.getenv("LLM_MODEL_CONCURRENCY", "").split(",") if "=" in item
+    )
+}
+# How long a call may wait for a free slot before giving up with Busy.
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "60"))
+
+
+def _retryable():
+    # Only reached once client() has imported the SDK.
+    import openai
+    return (
+        openai.RateLimitError,
+        openai.APIConnectionError,
+        openai.APITimeoutError,
+        openai.InternalServerError,
+    )
+
+
+class Busy(Exception):
+    """No concurrency slot for the model freed up within the queue timeout."""
+
+
+_client = None
+_lock = threading.Lock()
+_gates = {}
+
+
+def client():
+    global _client
+    with _lock:
+        if _client is None:
+            import openai
+
+            # One client for the whole process: its HTTP connection pool
+            # keeps API connections alive between calls. Retries are handled
+            # below (so they also cover streamed calls); the SDK's own are
+            # switched off.
+            _client = openai.OpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"), timeout=TIMEOUT_SECONDS, max_retries=0
+            )
+        return _client
+
+
+def _gate(model):
+    with _lock:
+        if model not in _gates:
+            _gates[model] = threading.BoundedSemaphore(max(1, MODEL_CONCURRENCY.get(model, CONCURRENCY)))
+        return _gates[model]
+
+
+def _acquire(model):
+    gate = _gate(model)
+    with metrics.timer(metrics.LLM_QUEUE_SECONDS, "llm.queue", model=model):
+        acquired = gate.acquire(timeout=QUEUE_TIMEOUT_SECONDS)
+    if not acquired:
+        raise Busy(f"Too many concurrent requests for {model}")
+    return gate
+
+
+def _with_retry(model, fn):
+    # Runs fn() in one of the model's slots and returns (slot, start, result),
+    # where start is when the successful attempt was sent; the caller
+    # releases the slot when done with the result. The slot is given up
+    # while backing off, so a failing upstream does not keep it busy.
+    for attempt in range(MAX_RETRIES + 1):
+        gate = _acquire(model)
+        try:
+            start = time.perf_counter()
+            return gate, start, fn()
+        except _retryable() as e:
+            gate.release()
+            if attempt == MAX_RETRIES:
+                raise
+            metrics.LLM_RETRIES.inc(model=model, reason=type(e).__name__)
+        except BaseException:
+            gate.release()
+            raise
+        # Exponential backoff with full jitter: 0–1s, 0–2s, 0–4s, ...
+        time.sleep(random.uniform(0, 2 ** attempt))
+
+
+def _create(model, system_prompt, prompt, endpoint=None, **kwargs):
+    endpoint = endpoint or metrics.endpoint("worker")
+    metrics.PROMPT_CHARS.observe(len(system_prompt) + len(prompt), endpoint=endpoint, model=model)
+    return _with_retry(model, lambda: client().chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=1,
+        **kwargs,
+    ))
+
+
+def _record_usage(model, usage):
+    if usage is not None:
+        metrics.LLM_TOKENS.inc(usage.prompt_tokens or 0, model=model, kind="prompt")
+        metrics.LLM_TOKENS.inc(usage.completion_tokens or 0, model=model, kind="completion")
+
+
+def complete(model, system_prompt, prompt, endpoint=None):
+    """Runs one chat completion and returns its stripped text.
+
+    `endpoint` labels the call in the metrics; by default it is the current
+    request's, which threads fanned out from a request do not have.
+    """
+    # Only the successful attempt is timed; slot waits and retries have
+    # their own metrics.
+    gate, start, response = _create(model, system_prompt, prompt, endpoint)
+    elapsed = time.perf_counter() - start
+    gate.release()
+    metrics.LLM_SECONDS.observe(elapsed, model=model, mode="complete")
+    metrics.record("llm", elapsed)
+    _record_usage(model, response.usage)
+    return response.choices[0].message.content.strip()
+
+
+def stream(model, system_prompt, prompt):
+    """Yields the completion text piece by piece as it arrives.
+
+    Only opening the stream is retried; once text has been yielded a
+    failure propagates to the caller. The model's slot is held until the
+    stream is exhausted or closed.
+    """
+    gate, start, response = _create(model, system_prompt, prompt, stream=True, stream_options={"include_usage": True})
+    try:
+        for chunk in response:
+            _record_usage(model, getattr(chunk, "usage", None))
+            if not chunk.choices:
+                continue
+            piece = chunk.choices[0].delta.content
+            if piece:
+                yield piece
+    finally:
+        gate.release()
+        metrics.LLM_SECONDS.observe(time.perf_counter() - start, model=model, mode="stream")
+
+
+# ─── Prompts and replies ───────────────────────────────────────────────
+def system_prompt(base, instructions=""):
+    """`base` with the user's extra instructions, if any, on a new line."""
+    return base + ("\n" + instructions if instructions else "")
+
+
+def parse_json_array(text):
+    """The JSON array in a model reply, ignoring any prose or code fence
+    around it."""
+    match = re.search(r"(\[.*\])", text, re.S)
+    return json.loads(match.group(1) if match else text)
@@ -0,0 +1,149 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# ─── Persistent LLM response cache ─────────────────────────────────────
+# Completions for /summarize, /generate-cards and /generate-quiz are cached
+# by a hash of (model, system prompt, user prompt, temperature). The user
+# prompt already embeds the selected documents, so the same files +
+# model + instructions hit the same entry for any user. Entries live in
+# their own SQLite file and are evicted by age (TTL) and by total size
+# (least recently used first).
+CACHE_DB = os.getenv("LLM_CACHE_DB", "llm_cache.db")
+TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "bypassed": 0, "evictions": 0}
+
+
+def _connect():
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        return conn
+    conn = sqlite3.connect(CACHE_DB, timeout=10, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS responses (
+            key       TEXT PRIMARY KEY,
+            model     TEXT NOT NULL,
+            response  TEXT NOT NULL,
+            size      INTEGER NOT NULL,
+            created   REAL NOT NULL,
+            last_used REAL NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS responses_by_use ON responses (last_used)")
+    _local.conn = conn
+    return conn
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        _stats[name] += n
+
+
+def make_key(model, system_prompt, prompt, temperature=1):
+    payload = json.dumps([model, system_prompt, prompt, temperature], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get(key):
+    """The cached response for `key`, or None on a miss or expired entry."""
+    conn = _connect()
+    row = conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+    now = time.time()
+    if row is None or now - row[1] > TTL_SECONDS:
+        _count("misses")
+        return None
+    conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+    _count("hits")
+    return row[0]
+
+
+def put(key, model, response):
+    conn = _connect()
+    now = time.time()
+    size = len(response.encode("utf-8"))
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, model, response, size, now, now),
+        )
+        evicted = conn.execute("DELETE FROM responses WHERE created < ?", (now - TTL_SECONDS,)).rowcount
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > MAX_BYTES:
+            for old_key, old_size in conn.execute(
+                "SELECT key, size FROM responses WHERE key != ? ORDER BY last_used", (key,)
+            ).fetchall():
+                conn.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                evicted += 1
+                total -= old_size
+                if total <= MAX_BYTES:
+                    break
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    if evicted:
+        _count("evictions", evicted)
+
+
+def delete(key):
+    _connect().execute("DELETE FROM responses WHERE key = ?", (key,))
+
+
+def _valid(response, validate):
+    if validate is None:
+        return True
+    try:
+        validate(response)
+    except Exception:
+        return False
+    return True
+
+
+def cached_call(model, system_prompt, prompt, call, bypass=False, temperature=1, validate=None):
+    """Returns call() through the cache. bypass=True skips the lookup but
+    still stores the fresh response.
+
+    With `validate` (e.g. the caller's parser), only responses it accepts
+    without raising are stored or served from the cache; a malformed
+    reply is returned uncached, so the caller fails once and the next
+    identical request asks the model again.
+    """
+    if not ENABLED:
+        return call()
+    key = make_key(model, system_prompt, prompt, temperature)
+    if bypass:
+        _count("bypassed")
+    else:
+        hit = get(key)
+        if hit is not None:
+            if _valid(hit, validate):
+                return hit
+            delete(key)
+    response = call()
+    if _valid(response, validate):
+        put(key, model, response)
+    return response
+
+
+def stats():
+    with _stats_lock:
+        snapshot = dict(_stats)
+    lookups = snapshot["hits"] + snapshot["misses"]
+    snapshot["hit_rate"] = snapshot["hits"] / lookups if lookups else 0.0
+    row = _connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+    snapshot["entries"], snapshot["bytes"] = row
+    return snapshot
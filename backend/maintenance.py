@@ -0,0 +1,41 @@
+import os
+import time
+import logging
+import threading
+
+import storage
+
+# ─── Periodic compaction ───────────────────────────────────────────────
+# Runs storage.compact() every COMPACT_INTERVAL_SECONDS while the server
+# is up. Every worker process checks every CHECK_SECONDS, but the
+# compacted_at lease in the study DB lets only one of them run each pass.
+# COMPACT_INTERVAL_SECONDS=0 disables it; `python storage.py compact`
+# runs a pass by hand (safe while the server is serving).
+INTERVAL_SECONDS = int(os.getenv("COMPACT_INTERVAL_SECONDS", str(6 * 3600)))
+CHECK_SECONDS = 5 * 60
+
+log = logging.getLogger(__name__)
+_lock = threading.Lock()
+_thread = None
+
+
+def _run():
+    while True:
+        time.sleep(CHECK_SECONDS)
+        try:
+            result = storage.compact_if_due(INTERVAL_SECONDS)
+            if result is not None:
+                log.info("Compacted study store: %s", result)
+        except Exception:
+            log.exception("Compaction failed")
+
+
+def start():
+    """Starts this process's compaction thread (once)."""
+    global _thread
+    if INTERVAL_SECONDS <= 0:
+        return
+    with _lock:
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name="compaction", daemon=True)
+            _thread.start()
@@ -0,0 +1,176 @@
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+# ─── In-process metrics ────────────────────────────────────────────────
+# Minimal counters, gauges and histograms rendered in the Prometheus text
+# format on /metrics. Values are per process: scrape each gunicorn worker
+# (or sum them) when running several.
+#
+# timer() also feeds the optional per-request profile: when a request
+# carries "X-Profile: 1", every timed section it runs is collected and
+# returned in a Server-Timing response header.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (1_000, 5_000, 20_000, 50_000, 100_000, 250_000, 500_000, 1_000_000)
+
+_registry = []
+
+
+def _label_key(names, labels):
+    return tuple(str(labels.get(n, "")) for n in names)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labels, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_format_labels(self.labels, k)} {v}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(self.labels, labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labels, labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            items = sorted((k, (list(c), s)) for k, (c, s) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [le])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def endpoint(default="unknown"):
+    """Name of the view serving the current request without its blueprint
+    prefix ("summarize", not "heavy.summarize"), or `default` outside one."""
+    if not has_request_context() or request.endpoint is None:
+        return default
+    return request.endpoint.rpartition(".")[2]
+
+
+# ─── Per-request profile ───────────────────────────────────────────────
+def start_profile():
+    g.wisebud_profile = {}
+
+
+def record(section, seconds):
+    if has_request_context() and "wisebud_profile" in g:
+        total, count = g.wisebud_profile.get(section, (0.0, 0))
+        g.wisebud_profile[section] = (total + seconds, count + 1)
+
+
+def server_timing():
+    """Server-Timing header value for the current request's profile, or None."""
+    if not has_request_context() or "wisebud_profile" not in g:
+        return None
+    return ", ".join(
+        f'{name.replace(".", "-")};dur={total * 1000:.2f};desc="{count}x"'
+        for name, (total, count) in g.wisebud_profile.items()
+    )
+
+
+@contextmanager
+def timer(histogram, section, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed, **labels)
+        record(section, elapsed)
+
+
+# ─── Metric definitions ────────────────────────────────────────────────
+REQUEST_SECONDS = Histogram(
+    "wisebud_request_seconds", "HTTP request latency by endpoint.", ("endpoint", "method", "status")
+)
+STORAGE_SECONDS = Histogram("wisebud_storage_seconds", "Study store operation latency.", ("op",))
+BLOB_BYTES = Counter("wisebud_blob_bytes_total", "Uncompressed blob payload bytes read or written.", ("direction",))
+EXTRACT_SECONDS = Histogram("wisebud_extract_seconds", "Upload text extraction time per file type.", ("type",))
+EXTRACT_BYTES = Counter("wisebud_extract_bytes_total", "Extracted payload bytes per file type.", ("type",))
+PROMPT_CHARS = Histogram(
+    "wisebud_prompt_chars", "Characters sent to the model per call.", ("endpoint", "model"), SIZE_BUCKETS
+)
+LLM_SECONDS = Histogram(
+    "wisebud_llm_seconds", "LLM round-trip time per call, excluding slot waits and retries.", ("model", "mode")
+)
+LLM_QUEUE_SECONDS = Histogram("wisebud_llm_queue_seconds", "Time spent waiting for a model slot.", ("model",))
+LLM_RETRIES = Counter("wisebud_llm_retries_total", "Retried LLM calls by failure.", ("model", "reason"))
+LLM_TOKENS = Counter("wisebud_llm_tokens_total", "Token usage reported by the model.", ("model", "kind"))
+LLM_CACHE = Gauge("wisebud_llm_cache", "LLM response cache counters and size.", ("stat",))
+UPLOADS_PENDING = Gauge("wisebud_uploads_pending", "Files queued or being extracted in this process.")
+ADMISSION = Counter(
+    "wisebud_admission_total", "LLM-backed requests by admission outcome.", ("endpoint", "outcome")
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "wisebud_admission_wait_seconds", "Time spent queued for a request slot.", ("endpoint",)
+)
+ADMISSION_QUEUED = Gauge("wisebud_admission_queued", "Requests waiting for a slot in this process.")
+WARM_POOL = Counter(
+    "wisebud_warm_pool_total", "Warm pool lookups (hit/miss) and background generations.", ("kind", "outcome")
+)
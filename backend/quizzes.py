@@ -0,0 +1,29 @@
+import llm
+
+# ─── Quiz generation ───────────────────────────────────────────────────
+# One model call per quiz over the selected documents, merged and capped
+# at MAX_CHARS. Used by /generate-quiz and the warm pool (warm_pool.py).
+MAX_CHARS = 950_000
+SYSTEM_PROMPT = "You generate multiple-choice quizzes in JSON."
+
+
+def system_prompt(instructions=""):
+    return llm.system_prompt(SYSTEM_PROMPT, instructions)
+
+
+def _prompt(text):
+    return (
+        "You are a quiz generator for a midterm exam. Based on the following material, "
+        "generate **exactly 10** clear multiple-choice questions that cover important concepts students should know. "
+        "Each question must have exactly four distinct answer options labeled A, B, C, and D. "
+        "Clearly indicate the correct answer using a 'correctAnswer' field. "
+        "Return the result as a valid JSON array of 10 objects. "
+        "Each object must contain a 'question', an 'options' dictionary with keys A/B/C/D, and a 'correctAnswer' key.\n\n"
+        + text
+    )
+
+
+def generate_quiz(texts, complete):
+    """Ten question dicts ('question', 'options' A-D, 'correctAnswer')
+    from a single `complete(prompt)` call over the joined texts."""
+    return llm.parse_json_array(complete(_prompt("\n\n".join(texts)[:MAX_CHARS])))
@@ -0,0 +1,135 @@
+import os
+import re
+import hashlib
+
+# ─── Lexical retrieval index for /ask ──────────────────────────────────
+# Course material (file text, summaries, quiz questions, flashcards) is split
+# into overlapping chunks and indexed in an SQLite FTS5 table, ranked with
+# its built-in BM25. Every chunk carries a `scope` token derived from
+# (username, course), so a search only ever intersects with that course's
+# postings. storage.py calls index() and unindex() as it inserts and
+# deletes material, so a search never returns chunks of a deleted file.
+CHUNK_CHARS = int(os.getenv("ASK_CHUNK_CHARS", "1200"))
+CHUNK_OVERLAP = int(os.getenv("ASK_CHUNK_OVERLAP", "200"))
+CONTEXT_BUDGET = int(os.getenv("ASK_CONTEXT_CHARS", "24000"))
+TOP_K = int(os.getenv("ASK_TOP_K", "20"))
+MAX_QUERY_TERMS = 32
+
+SCHEMA = [
+    """
+    CREATE TABLE chunks (
+        id       INTEGER PRIMARY KEY,
+        username TEXT NOT NULL,
+        course   TEXT NOT NULL,
+        source   TEXT NOT NULL,
+        ref      TEXT NOT NULL,
+        scope    TEXT NOT NULL,
+        text     TEXT NOT NULL
+    )
+    """,
+    "CREATE INDEX chunks_by_source ON chunks (username, course, source, ref)",
+    """
+    CREATE VIRTUAL TABLE chunks_fts USING fts5(
+        text, scope, content='chunks', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER chunks_ai AFTER INSERT ON chunks BEGIN
+        INSERT INTO chunks_fts (rowid, text, scope) VALUES (new.id, new.text, new.scope);
+    END
+    """,
+    """
+    CREATE TRIGGER chunks_ad AFTER DELETE ON chunks BEGIN
+        INSERT INTO chunks_fts (chunks_fts, rowid, text, scope) VALUES ('delete', old.id, old.text, old.scope);
+    END
+    """,
+]
+
+
+def _scope(username, course):
+    return "s" + hashlib.sha1(f"{username}\0{course}".encode("utf-8")).hexdigest()[:24]
+
+
+def chunk_text(text, size=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    """Splits text into ~size-character pieces, preferring line/word breaks."""
+    chunks = []
+    start, n = 0, len(text)
+    while start < n:
+        end = min(n, start + size)
+        if end < n:
+            cut = text.rfind("\n", start + size // 2, end)
+            if cut == -1:
+                cut = text.rfind(" ", start + size // 2, end)
+            if cut != -1:
+                end = cut
+        piece = text[start:end].strip()
+        if piece:
+            chunks.append(piece)
+        if end >= n:
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+def create_schema(conn):
+    for stmt in SCHEMA:
+        conn.execute(stmt)
+
+
+def index(conn, username, course, source, ref, text):
+    conn.executemany(
+        "INSERT INTO chunks (username, course, source, ref, scope, text) VALUES (?, ?, ?, ?, ?, ?)",
+        [(username, course, source, str(ref), _scope(username, course), c) for c in chunk_text(text)],
+    )
+
+
+def unindex(conn, username, course, source, refs):
+    conn.executemany(
+        "DELETE FROM chunks WHERE username = ? AND course = ? AND source = ? AND ref = ?",
+        [(username, course, source, str(r)) for r in refs],
+    )
+
+
+def merge(conn, pages):
+    """One incremental merge step over the FTS index's segments, writing
+    about `pages` pages. Returns False once there is nothing left to merge."""
+    before = conn.total_changes
+    conn.execute("INSERT INTO chunks_fts (chunks_fts, rank) VALUES ('merge', ?)", (pages,))
+    return conn.total_changes - before >= 2
+
+
+def _match_expression(scope, query):
+    terms = list(dict.fromkeys(re.findall(r"\w+", query.lower())))[:MAX_QUERY_TERMS]
+    if not terms:
+        return None
+    return f'scope:"{scope}" AND (' + " OR ".join(f'"{t}"' for t in terms) + ")"
+
+
+def search(conn, username, course, query, budget=CONTEXT_BUDGET, top_k=TOP_K):
+    """Best-matching chunks for the query, best first, totalling at most `budget` characters.
+
+    Falls back to the course's earliest chunks when nothing matches, so broad
+    questions ("what is this course about?") still get some material.
+    """
+    scope = _scope(username, course)
+    expr = _match_expression(scope, query)
+    rows = []
+    if expr:
+        rows = conn.execute(
+            "SELECT c.text FROM chunks_fts JOIN chunks c ON c.id = chunks_fts.rowid "
+            "WHERE chunks_fts MATCH ? ORDER BY bm25(chunks_fts, 1.0, 0.0) LIMIT ?",
+            (expr, top_k),
+        ).fetchall()
+    if not rows:
+        rows = conn.execute(
+            "SELECT text FROM chunks WHERE username = ? AND course = ? ORDER BY id LIMIT ?",
+            (username, course, top_k),
+        ).fetchall()
+
+    picked, used = [], 0
+    for r in rows:
+        if used + len(r["text"]) > budget:
+            continue
+        picked.append(r["text"])
+        used += len(r["text"])
+    return picked
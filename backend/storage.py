@@ -0,0 +1,1149 @@
+import os
+import json
+import time
+import zlib
+import base64
+import sqlite3
+import hashlib
+import datetime
+import threading
+import functools
+from contextlib import contextmanager
+
+import blobstore
+import dedupe
+import metrics
+import retrieval
+from helpers import IMAGE_EXTENSIONS
+
+# ─── SQLite study store ────────────────────────────────────────────────
+# One row per file / card / summary / quiz / todo, keyed by user and course,
+# so each endpoint only reads and writes the rows it touches instead of
+# reparsing and rewriting everyone's data.
+#
+# Safe under several gunicorn workers and threads: every write runs in a
+# BEGIN IMMEDIATE transaction, so read-modify-write sequences (grading a
+# card, allocating card ids) are serialized across processes, and WAL
+# journaling keeps the file consistent if a worker dies mid-write.
+DB = os.getenv("STUDY_DB", "study_data.db")
+LEGACY_JSON = os.getenv("STUDY_JSON", "study_data.json")
+BUSY_TIMEOUT_MS = int(os.getenv("STUDY_DB_BUSY_TIMEOUT_MS", "10000"))
+
+def _move_file_text_to_blobs(conn):
+    conn.execute("ALTER TABLE files ADD COLUMN kind TEXT NOT NULL DEFAULT 'text'")
+    conn.execute("ALTER TABLE files ADD COLUMN blob TEXT")
+    conn.execute("ALTER TABLE files ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+    conn.execute("ALTER TABLE files ADD COLUMN pages INTEGER")
+    for row in conn.execute("SELECT id, name, text FROM files").fetchall():
+        kind, digest, size = _store_payload(row["name"], row["text"])
+        conn.execute(
+            "UPDATE files SET kind = ?, blob = ?, size = ? WHERE id = ?", (kind, digest, size, row["id"])
+        )
+    conn.execute("ALTER TABLE files DROP COLUMN text")
+    conn.execute("CREATE INDEX files_by_blob ON files (blob)")
+
+
+def _index_cards_by_due(conn):
+    conn.execute("ALTER TABLE cards ADD COLUMN due REAL NOT NULL DEFAULT 0")
+    for row in conn.execute("SELECT username, course, id, data FROM cards").fetchall():
+        conn.execute(
+            "UPDATE cards SET due = ? WHERE username = ? AND course = ? AND id = ?",
+            (_due(json.loads(row["data"])), row["username"], row["course"], row["id"]),
+        )
+    conn.execute("CREATE INDEX cards_by_due ON cards (username, course, due)")
+
+
+def _build_retrieval_index(conn):
+    retrieval.create_schema(conn)
+    for f in conn.execute("SELECT * FROM files WHERE kind = 'text'").fetchall():
+        retrieval.index(conn, f["username"], f["course"], "file", f["id"], blobstore.get_text(f["blob"]))
+    for s in conn.execute("SELECT * FROM summaries").fetchall():
+        retrieval.index(conn, s["username"], s["course"], "summary", s["id"], s["summary"])
+    for q in conn.execute("SELECT * FROM quizzes").fetchall():
+        _index_quiz(conn, q["username"], q["course"], q["id"], json.loads(q["questions"]))
+    for c in conn.execute("SELECT * FROM cards").fetchall():
+        _index_card(conn, c["username"], c["course"], json.loads(c["data"]))
+
+
+def _build_card_bands(conn):
+    dedupe.create_schema(conn)
+    for c in conn.execute("SELECT username, course, data FROM cards").fetchall():
+        dedupe.index(conn, c["username"], c["course"], json.loads(c["data"]))
+
+
+# Each entry upgrades the schema by one version (tracked in PRAGMA user_version);
+# strings are SQL scripts, callables get the connection for data migrations.
+MIGRATIONS = [
+    """
+    CREATE TABLE files (
+        id       INTEGER PRIMARY KEY,
+        username TEXT NOT NULL,
+        course   TEXT NOT NULL,
+        name     TEXT NOT NULL,
+        text     TEXT NOT NULL
+    );
+    CREATE INDEX files_by_course ON files (username, course, name);
+
+    CREATE TABLE cards (
+        username TEXT NOT NULL,
+        course   TEXT NOT NULL,
+        id       INTEGER NOT NULL,
+        data     TEXT NOT NULL,
+        PRIMARY KEY (username, course, id)
+    );
+
+    CREATE TABLE summaries (
+        id       INTEGER PRIMARY KEY,
+        username TEXT NOT NULL,
+        course   TEXT NOT NULL,
+        summary  TEXT NOT NULL
+    );
+    CREATE INDEX summaries_by_course ON summaries (username, course);
+
+    CREATE TABLE quizzes (
+        id        INTEGER PRIMARY KEY,
+        username  TEXT NOT NULL,
+        course    TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        files     TEXT NOT NULL,
+        questions TEXT NOT NULL
+    );
+    CREATE INDEX quizzes_by_course ON quizzes (username, course);
+
+    CREATE TABLE todos (
+        id       INTEGER PRIMARY KEY,
+        username TEXT NOT NULL,
+        text     TEXT NOT NULL
+    );
+    CREATE UNIQUE INDEX todos_by_user ON todos (username, text);
+
+    CREATE TABLE meta (
+        key   TEXT PRIMARY KEY,
+        value TEXT
+    );
+    """,
+    _move_file_text_to_blobs,
+    _index_cards_by_due,
+    _build_retrieval_index,
+    """
+    CREATE TABLE jobs (
+        id       TEXT PRIMARY KEY,
+        username TEXT NOT NULL,
+        course   TEXT NOT NULL,
+        total    INTEGER NOT NULL,
+        done     TEXT NOT NULL DEFAULT '[]',
+        failed   TEXT NOT NULL DEFAULT '{}',
+        created  TEXT NOT NULL
+    )
+    """,
+    _build_card_bands,
+    """
+    ALTER TABLE cards ADD COLUMN interval REAL NOT NULL DEFAULT 1;
+    ALTER TABLE cards ADD COLUMN ease REAL NOT NULL DEFAULT 2.5;
+    ALTER TABLE cards ADD COLUMN reviews INTEGER NOT NULL DEFAULT 0;
+    UPDATE cards SET interval = COALESCE(json_extract(data, '$.interval'), 1),
+                     ease = COALESCE(json_extract(data, '$.ease_factor'), 2.5),
+                     reviews = COALESCE(json_extract(data, '$.review_count'), 0);
+    DROP INDEX cards_by_due;
+    CREATE INDEX cards_by_due ON cards (username, course, due, interval, ease, reviews)
+    """,
+    """
+    CREATE TABLE uploads (
+        digest TEXT NOT NULL,
+        ext    TEXT NOT NULL,
+        kind   TEXT NOT NULL,
+        blob   TEXT NOT NULL,
+        size   INTEGER NOT NULL,
+        pages  INTEGER,
+        PRIMARY KEY (digest, ext)
+    )
+    """,
+    """
+    CREATE TABLE warm_sets (
+        key          TEXT PRIMARY KEY,
+        username     TEXT NOT NULL,
+        course       TEXT NOT NULL,
+        kind         TEXT NOT NULL,
+        files        TEXT,
+        model        TEXT,
+        instructions TEXT NOT NULL,
+        last_used    REAL NOT NULL
+    );
+    CREATE INDEX warm_sets_by_course ON warm_sets (username, course, last_used);
+
+    CREATE TABLE warm_pool (
+        id       INTEGER PRIMARY KEY,
+        username TEXT NOT NULL,
+        course   TEXT NOT NULL,
+        kind     TEXT NOT NULL,
+        key      TEXT NOT NULL,
+        created  REAL NOT NULL,
+        payload  TEXT
+    );
+    CREATE INDEX warm_pool_by_key ON warm_pool (username, course, kind, key, created)
+    """,
+    """
+    CREATE TABLE history_archive (
+        id       INTEGER PRIMARY KEY,
+        username TEXT NOT NULL,
+        course   TEXT NOT NULL,
+        kind     TEXT NOT NULL,
+        first_id INTEGER NOT NULL,
+        last_id  INTEGER NOT NULL,
+        count    INTEGER NOT NULL,
+        archived TEXT NOT NULL,
+        data     BLOB NOT NULL
+    );
+    CREATE INDEX history_archive_by_course ON history_archive (username, course, kind, first_id)
+    """,
+]
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = set()
+
+
+def _timed(fn):
+    # Latency of each public store operation, labelled by function name.
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with metrics.timer(metrics.STORAGE_SECONDS, "storage." + fn.__name__, op=fn.__name__):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def _connect():
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "path", None) == DB:
+        return conn
+    conn = sqlite3.connect(DB, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    # Takes effect only on a brand-new file, and only before WAL is
+    # switched on; lets compact() free pages a few at a time.
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    _local.conn, _local.path = conn, DB
+    with _init_lock:
+        if DB not in _initialized:
+            _migrate_schema(conn)
+            _import_legacy_json(conn)
+            _initialized.add(DB)
+    return conn
+
+
+def _migrate_schema(conn):
+    # Re-read the version under the write lock so concurrently booting
+    # workers apply each migration exactly once.
+    with _transaction(conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for i, script in enumerate(MIGRATIONS[version:], start=version + 1):
+            if callable(script):
+                script(conn)
+            else:
+                for stmt in script.split(";"):
+                    if stmt.strip():
+                        conn.execute(stmt)
+            conn.execute(f"PRAGMA user_version = {i}")
+
+
+@contextmanager
+def _transaction(conn):
+    if conn.in_transaction:
+        # Nested call: join the enclosing transaction.
+        yield conn
+        return
+    with metrics.timer(metrics.STORAGE_SECONDS, "storage.lock_wait", op="lock_wait"):
+        conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def transaction():
+    """Write transaction holding the database write lock until it exits.
+
+    Wrap a read-modify-write sequence in one of these so concurrent
+    requests cannot interleave between the read and the write.
+    """
+    return _transaction(_connect())
+
+
+# ─── One-shot migration from study_data.json ───────────────────────────
+def _import_legacy_json(conn, path=None):
+    path = path or LEGACY_JSON
+    if not os.path.exists(path):
+        return 0
+
+    with _transaction(conn):
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return 0
+        with open(path) as f:
+            data = json.load(f)
+
+        for username, db in data.items():
+            for course, files in db.get("files", {}).items():
+                _insert_files(conn, username, course, [_legacy_entry(f) for f in files])
+            for course, cards in db.get("cards", {}).items():
+                _insert_cards(conn, username, course, [c for c in cards if "id" in c])
+            for s in db.get("summaries", []):
+                _insert_summary(conn, username, s.get("course", ""), s["summary"])
+            for q in db.get("quizzes", []):
+                _insert_quiz(
+                    conn, username, q.get("course", ""), q.get("timestamp", ""),
+                    q.get("files", []), q.get("questions", []),
+                )
+            conn.executemany(
+                "INSERT OR IGNORE INTO todos (username, text) VALUES (?, ?)",
+                [(username, t) for t in db.get("todos", [])],
+            )
+        conn.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (os.path.abspath(path),))
+    return len(data)
+
+
+def migrate_json(path=None):
+    return _import_legacy_json(_connect(), path)
+
+
+# ─── Files ─────────────────────────────────────────────────────────────
+# A file row holds only metadata; the extracted payload is a blob (see
+# blobstore.py). kind is "text" for extracted text or "image" for raw PNG.
+#
+# The uploads table maps the SHA-256 of raw uploaded bytes (plus the file
+# extension, which picks the extractor) to the extraction result, so the
+# same file uploaded again, by anyone, reuses the stored blob instead of
+# being extracted again. Sharing is safe: a hit requires the uploader to
+# hold the identical bytes already.
+def _store_payload(name, text):
+    # Legacy rows carry images as base64 PNG text; keep the raw bytes instead.
+    if name.lower().endswith(IMAGE_EXTENSIONS):
+        raw = base64.b64decode(text)
+        return "image", blobstore.put(raw, compress=False), len(raw)
+    return "text", blobstore.put_text(text), len(text.encode("utf-8"))
+
+
+def _legacy_entry(f):
+    kind, digest, size = _store_payload(f["name"], f["text"])
+    return {"name": f["name"], "kind": kind, "blob": digest, "size": size, "pages": None, "text": f["text"]}
+
+
+def _insert_files(conn, username, course, entries):
+    for e in entries:
+        cur = conn.execute(
+            "INSERT INTO files (username, course, name, kind, blob, size, pages) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (username, course, e["name"], e["kind"], e["blob"], e["size"], e.get("pages")),
+        )
+        if e["kind"] != "text":
+            continue
+        # Index page by page straight from the blob's segments rather than
+        # loading the whole document.
+        for text in [e["text"]] if "text" in e else blobstore.iter_segments(e["blob"]):
+            retrieval.index(conn, username, course, "file", cur.lastrowid, text)
+
+
+def _upload_ext(name):
+    return os.path.splitext(name)[1].lower()
+
+
+def _remove_files(conn, username, course, name):
+    ids = [r["id"] for r in conn.execute(
+        "SELECT id FROM files WHERE username = ? AND course = ? AND name = ?", (username, course, name)
+    )]
+    retrieval.unindex(conn, username, course, "file", ids)
+    conn.executemany("DELETE FROM files WHERE id = ?", [(i,) for i in ids])
+    if ids:
+        _files_changed(conn, username, course)
+    return len(ids)
+
+
+def _put_file(conn, username, course, e):
+    existing = conn.execute(
+        "SELECT blob FROM files WHERE username = ? AND course = ? AND name = ?",
+        (username, course, e["name"]),
+    ).fetchall()
+    if not (len(existing) == 1 and existing[0]["blob"] == e["blob"]):
+        # _remove_files() already invalidates when it removed anything.
+        if not _remove_files(conn, username, course, e["name"]):
+            _files_changed(conn, username, course)
+        _insert_files(conn, username, course, [e])
+    if e.get("source"):
+        conn.execute(
+            "INSERT OR REPLACE INTO uploads (digest, ext, kind, blob, size, pages) VALUES (?, ?, ?, ?, ?, ?)",
+            (e["source"], _upload_ext(e["name"]), e["kind"], e["blob"], e["size"], e.get("pages")),
+        )
+
+
+@_timed
+def add_files(username, course, entries):
+    """entries: dicts with name, kind, blob, size, optional pages,
+    optionally the extracted text for the retrieval index, and optionally
+    `source`, the SHA-256 of the raw upload, to remember the extraction by.
+
+    An entry replaces any existing file of the same name in the course; an
+    unchanged re-upload (same name, same payload) is left as it is.
+    """
+    with transaction() as conn:
+        for e in entries:
+            _put_file(conn, username, course, e)
+        return count_files(username, course)
+
+
+@_timed
+def find_upload(source, name):
+    """The stored extraction of a previous upload with the same raw bytes
+    and extension, as a file entry named `name`, or None."""
+    row = _connect().execute(
+        "SELECT kind, blob, size, pages FROM uploads WHERE digest = ? AND ext = ?", (source, _upload_ext(name))
+    ).fetchone()
+    if row is None or not blobstore.touch(row["blob"]):
+        return None
+    return dict(row, name=name, source=source)
+
+
+def count_files(username, course):
+    row = _connect().execute(
+        "SELECT COUNT(*) FROM files WHERE username = ? AND course = ?", (username, course)
+    ).fetchone()
+    return row[0]
+
+
+@_timed
+def list_file_names(username, course):
+    rows = _connect().execute(
+        "SELECT DISTINCT name FROM files WHERE username = ? AND course = ? ORDER BY name",
+        (username, course),
+    )
+    return [r["name"] for r in rows]
+
+
+@_timed
+def get_files(username, course, names=None):
+    """File metadata for the course; pass entries to file_text() for the payload."""
+    rows = _connect().execute(
+        "SELECT name, kind, blob, size, pages FROM files WHERE username = ? AND course = ? ORDER BY id",
+        (username, course),
+    )
+    return [dict(r) for r in rows if names is None or r["name"] in names]
+
+
+@_timed
+def file_text(entry):
+    # Images are handed to prompts as base64 PNG, as they were before blobs.
+    if entry["kind"] == "image":
+        return base64.b64encode(blobstore.get(entry["blob"])).decode()
+    return blobstore.get_text(entry["blob"])
+
+
+@_timed
+def search_context(username, course, query, budget=None):
+    """Course material chunks relevant to `query`, within the character budget."""
+    return retrieval.search(_connect(), username, course, query, budget or retrieval.CONTEXT_BUDGET)
+
+
+@_timed
+def read_pages(entry, first, last=None):
+    """Text of pages first..last (1-based, inclusive) of an extracted file.
+
+    Pages are the segments the extractor stored: PDF pages, or fixed-size
+    blocks for other text files.
+    """
+    return blobstore.read_segments(entry["blob"], first - 1, (last or first) - 1)
+
+
+def collect_garbage():
+    """Removes blobs no longer referenced by any file row, and forgets
+    upload extractions whose blob is going away."""
+    with transaction() as conn:
+        conn.execute("DELETE FROM uploads WHERE blob NOT IN (SELECT blob FROM files)")
+        live = {r["blob"] for r in conn.execute("SELECT DISTINCT blob FROM files")}
+    return blobstore.gc(live)
+
+
+@_timed
+def delete_files(username, course, name):
+    """Returns the number of removed entries, or None if the course has no files."""
+    with transaction() as conn:
+        if not conn.execute(
+            "SELECT 1 FROM files WHERE username = ? AND course = ? LIMIT 1", (username, course)
+        ).fetchone():
+            return None
+        return _remove_files(conn, username, course, name)
+
+
+# ─── Cards ─────────────────────────────────────────────────────────────
+# `due` mirrors the card's next_review as a POSIX timestamp. The
+# (username, course, due) index keeps each course's deck sorted by review
+# time, so the next due card is a single index seek and grading a card
+# is a primary-key lookup plus an index update. `interval`, `ease` and
+# `reviews` mirror the rest of the schedule and are covered by the same
+# index, so /deck-stats reads a whole deck without touching the card JSON.
+def _due(card):
+    return datetime.datetime.fromisoformat(card["next_review"]).timestamp()
+
+
+def _schedule(card):
+    return card.get("interval", 1), card.get("ease_factor", 2.5), card.get("review_count", 0), _due(card)
+
+
+def _card_text(card):
+    return f"Q: {card.get('question')}\nA: {card.get('answer')}"
+
+
+def _index_card(conn, username, course, card):
+    retrieval.index(conn, username, course, "card", card["id"], _card_text(card))
+
+
+def _insert_cards(conn, username, course, cards):
+    conn.executemany(
+        "INSERT OR REPLACE INTO cards (username, course, id, data, interval, ease, reviews, due)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [(username, course, c["id"], json.dumps(c), *_schedule(c)) for c in cards],
+    )
+    for c in cards:
+        _index_card(conn, username, course, c)
+        dedupe.index(conn, username, course, c)
+
+
+def _load_cards(conn, username, course, ids):
+    rows = conn.execute(
+        f"SELECT id, data FROM cards WHERE username = ? AND course = ? AND id IN ({', '.join('?' * len(ids))})",
+        [username, course, *ids],
+    )
+    return {r["id"]: json.loads(r["data"]) for r in rows}
+
+
+@_timed
+def next_due_card(username, course):
+    """The card with the earliest next_review, or None if the course has no cards."""
+    row = _connect().execute(
+        "SELECT data FROM cards WHERE username = ? AND course = ? ORDER BY due LIMIT 1",
+        (username, course),
+    ).fetchone()
+    return json.loads(row["data"]) if row else None
+
+
+@_timed
+def due_cards(username, course, limit):
+    """Up to `limit` cards in review order (earliest next_review first)."""
+    rows = _connect().execute(
+        "SELECT data FROM cards WHERE username = ? AND course = ? ORDER BY due LIMIT ?",
+        (username, course, limit),
+    )
+    return [json.loads(r["data"]) for r in rows]
+
+
+@_timed
+def card_schedules(username, course):
+    """(interval, ease_factor, review_count, due) tuples for every card in the
+    course, read from the schedule columns without decoding any card JSON."""
+    cur = _connect().cursor()
+    cur.row_factory = None
+    return cur.execute(
+        "SELECT interval, ease, reviews, due FROM cards WHERE username = ? AND course = ?", (username, course)
+    ).fetchall()
+
+
+@_timed
+def get_card(username, course, card_id):
+    row = _connect().execute(
+        "SELECT data FROM cards WHERE username = ? AND course = ? AND id = ?",
+        (username, course, card_id),
+    ).fetchone()
+    return json.loads(row["data"]) if row else None
+
+
+@_timed
+def get_cards_by_id(username, course, ids):
+    """{id: card} for the requested ids that exist in the course."""
+    ids = list(ids)
+    return _load_cards(_connect(), username, course, ids) if ids else {}
+
+
+@_timed
+def add_cards(username, course, cards, skip_duplicates=False):
+    """Assigns ids following the course's current maximum and stores the cards.
+
+    With skip_duplicates, cards that near-duplicate one already in the course
+    (or an earlier one in `cards`) are dropped before ids are assigned.
+    Returns the stored cards.
+    """
+    with transaction() as conn:
+        next_id = conn.execute(
+            "SELECT COALESCE(MAX(id), 0) + 1 FROM cards WHERE username = ? AND course = ?",
+            (username, course),
+        ).fetchone()[0]
+        stored = []
+        for c in cards:
+            # Checked one at a time against the band index, which already
+            # holds the cards inserted earlier in this batch.
+            if skip_duplicates and dedupe.find_duplicate(
+                conn, username, course, c, lambda ids: _load_cards(conn, username, course, ids)
+            ) is not None:
+                continue
+            c["id"] = next_id
+            next_id += 1
+            _insert_cards(conn, username, course, [c])
+            stored.append(c)
+    return stored
+
+
+@_timed
+def update_card(username, course, card):
+    update_cards(username, course, [card])
+
+
+@_timed
+def update_cards(username, course, cards):
+    with transaction() as conn:
+        conn.executemany(
+            "UPDATE cards SET data = ?, interval = ?, ease = ?, reviews = ?, due = ?"
+            " WHERE username = ? AND course = ? AND id = ?",
+            [(json.dumps(c), *_schedule(c), username, course, c["id"]) for c in cards],
+        )
+
+
+# ─── Summaries & quizzes ───────────────────────────────────────────────
+def _insert_summary(conn, username, course, summary):
+    cur = conn.execute(
+        "INSERT INTO summaries (username, course, summary) VALUES (?, ?, ?)",
+        (username, course, summary),
+    )
+    retrieval.index(conn, username, course, "summary", cur.lastrowid, summary)
+
+
+@_timed
+def add_summary(username, course, summary):
+    with transaction() as conn:
+        _insert_summary(conn, username, course, summary)
+        _enforce_retention(conn, username, course, "summary", HISTORY_ARCHIVE_SLACK)
+
+
+def _quiz_question_text(q):
+    return (
+        "Q: " + q["question"] + "\n"
+        + "\n".join(f"{letter}: {text}" for letter, text in q.get("options", {}).items()) + "\n"
+        + f"Correct Answer: {q.get('correctAnswer')}"
+    )
+
+
+def _index_quiz(conn, username, course, quiz_id, questions):
+    for q in questions:
+        retrieval.index(conn, username, course, "quiz", quiz_id, _quiz_question_text(q))
+
+
+def _insert_quiz(conn, username, course, timestamp, files, questions):
+    cur = conn.execute(
+        "INSERT INTO quizzes (username, course, timestamp, files, questions) VALUES (?, ?, ?, ?, ?)",
+        (username, course, timestamp, json.dumps(files), json.dumps(questions)),
+    )
+    _index_quiz(conn, username, course, cur.lastrowid, questions)
+
+
+@_timed
+def add_quiz(username, course, timestamp, files, questions):
+    with transaction() as conn:
+        _insert_quiz(conn, username, course, timestamp, files, questions)
+        _enforce_retention(conn, username, course, "quiz", HISTORY_ARCHIVE_SLACK)
+
+
+# ─── History retention ─────────────────────────────────────────────────
+# Only the newest HISTORY_KEEP_SUMMARIES summaries and HISTORY_KEEP_QUIZZES
+# quizzes per course stay in the live tables and the /ask index. Older
+# ones move, in the same transaction, into history_archive as
+# zlib-compressed JSON chunks that nothing reads on the request path;
+# exports still return them. Writes archive only
+# once a course is HISTORY_ARCHIVE_SLACK entries over its limit, so chunks
+# hold many entries rather than one each. 0 keeps everything.
+HISTORY_KEEP = {
+    "summary": int(os.getenv("HISTORY_KEEP_SUMMARIES", "50")),
+    "quiz": int(os.getenv("HISTORY_KEEP_QUIZZES", "50")),
+}
+HISTORY_ARCHIVE_SLACK = int(os.getenv("HISTORY_ARCHIVE_SLACK", "20"))
+_HISTORY_TABLES = {"summary": "summaries", "quiz": "quizzes"}
+
+
+def _history_entry(kind, row):
+    if kind == "summary":
+        return {"summary": row["summary"]}
+    return {"timestamp": row["timestamp"], "files": json.loads(row["files"]),
+            "questions": json.loads(row["questions"])}
+
+
+def _enforce_retention(conn, username, course, kind, slack):
+    keep, table = HISTORY_KEEP[kind], _HISTORY_TABLES[kind]
+    if keep <= 0:
+        return 0
+    count = conn.execute(
+        f"SELECT COUNT(*) FROM {table} WHERE username = ? AND course = ?", (username, course)
+    ).fetchone()[0]
+    if count <= keep + slack:
+        return 0
+    rows = conn.execute(
+        f"SELECT * FROM {table} WHERE username = ? AND course = ? ORDER BY id LIMIT ?",
+        (username, course, count - keep),
+    ).fetchall()
+    ids = [r["id"] for r in rows]
+    data = zlib.compress(json.dumps([_history_entry(kind, r) for r in rows]).encode("utf-8"), 9)
+    conn.execute(
+        "INSERT INTO history_archive (username, course, kind, first_id, last_id, count, archived, data)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (username, course, kind, ids[0], ids[-1], len(ids), datetime.datetime.now().isoformat(), data),
+    )
+    retrieval.unindex(conn, username, course, kind, ids)
+    conn.executemany(f"DELETE FROM {table} WHERE id = ?", [(i,) for i in ids])
+    return len(ids)
+
+
+def _iter_archived(conn, where, args, kind):
+    # (course, entry) pairs, oldest first within each course.
+    rows = conn.execute(
+        f"SELECT course, data FROM history_archive WHERE {where} AND kind = ? ORDER BY course, first_id",
+        (*args, kind),
+    )
+    for r in rows:
+        for entry in json.loads(zlib.decompress(r["data"])):
+            yield r["course"], entry
+
+
+# ─── Upload jobs ───────────────────────────────────────────────────────
+# Progress of background extraction jobs (see jobs.py), kept here so any
+# worker process can answer a status poll. Only the process running the
+# extraction updates a job, so one that is still unfinished after
+# JOB_STALE_SECONDS (that process restarted mid-job) is reported as
+# failed. Compaction deletes jobs once they are JOB_TTL_SECONDS old,
+# finished or not.
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", str(3600)))
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", str(24 * 3600)))
+
+
+@_timed
+def create_job(job_id, username, course, total):
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO jobs (id, username, course, total, created) VALUES (?, ?, ?, ?, ?)",
+            (job_id, username, course, total, datetime.datetime.now().isoformat()),
+        )
+
+
+@_timed
+def finish_job_file(job_id, name, error=None):
+    with transaction() as conn:
+        row = conn.execute("SELECT done, failed FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        done, failed = json.loads(row["done"]), json.loads(row["failed"])
+        if error is None:
+            done.append(name)
+        else:
+            failed[name] = error
+        conn.execute(
+            "UPDATE jobs SET done = ?, failed = ? WHERE id = ?", (json.dumps(done), json.dumps(failed), job_id)
+        )
+
+
+@_timed
+def get_job(username, job_id):
+    row = _connect().execute(
+        "SELECT * FROM jobs WHERE id = ? AND username = ?", (job_id, username)
+    ).fetchone()
+    if row is None:
+        return None
+    done, failed = json.loads(row["done"]), json.loads(row["failed"])
+    job = {
+        "job_id": row["id"],
+        "course": row["course"],
+        "status": "done" if len(done) + len(failed) >= row["total"] else "running",
+        "total": row["total"],
+        "done": done,
+        "failed": failed,
+        "created": row["created"],
+    }
+    age = datetime.datetime.now() - datetime.datetime.fromisoformat(row["created"])
+    if job["status"] == "running" and age.total_seconds() > JOB_STALE_SECONDS:
+        job["status"] = "failed"
+        job["error"] = "Extraction was interrupted; upload the missing files again"
+    return job
+
+
+def _expire_jobs(conn):
+    cutoff = (datetime.datetime.now() - datetime.timedelta(seconds=JOB_TTL_SECONDS)).isoformat()
+    return conn.execute("DELETE FROM jobs WHERE created < ?", (cutoff,)).rowcount
+
+
+# ─── Warm pool ─────────────────────────────────────────────────────────
+# Pre-generated quizzes and card batches (see warm_pool.py). warm_sets
+# lists what to keep warm: a kind, a file selection (NULL for every file
+# in the course), model (NULL for the default) and instructions, with when
+# it was last asked for. warm_pool holds the results, keyed by a
+# fingerprint of the selected files' content, model and instructions, so
+# a result made from an older version of a file can never be served. A
+# row without payload is a claim on a generation in progress, which keeps
+# several workers from filling the same slot. Any change to a course's
+# files drops its pool and re-marks the whole-course sets as wanted.
+WARM_KINDS = ("quiz", "cards")
+
+
+def _warm_set_key(username, course, kind, files, model, instructions):
+    payload = json.dumps([username, course, kind, files, model, instructions])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _note_warm_set(conn, username, course, kind, files, model, instructions):
+    conn.execute(
+        "INSERT INTO warm_sets (key, username, course, kind, files, model, instructions, last_used)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET last_used = excluded.last_used",
+        (_warm_set_key(username, course, kind, files, model, instructions), username, course, kind,
+         None if files is None else json.dumps(files), model, instructions, time.time()),
+    )
+
+
+def _files_changed(conn, username, course):
+    conn.execute("DELETE FROM warm_pool WHERE username = ? AND course = ?", (username, course))
+    for kind in WARM_KINDS:
+        _note_warm_set(conn, username, course, kind, None, None, "")
+
+
+@_timed
+def note_warm_set(username, course, kind, files, model, instructions):
+    """Marks a selection (sorted file names) as one to keep warm."""
+    with transaction() as conn:
+        _note_warm_set(conn, username, course, kind, files, model, instructions)
+
+
+@_timed
+def warm_sets(max_age, per_course):
+    """Selections asked for within `max_age` seconds, at most `per_course`
+    (most recent first) per user and course; older ones are forgotten."""
+    with transaction() as conn:
+        conn.execute("DELETE FROM warm_sets WHERE last_used < ?", (time.time() - max_age,))
+        rows = conn.execute(
+            "SELECT * FROM warm_sets ORDER BY username, course, last_used DESC"
+        ).fetchall()
+    sets, seen = [], {}
+    for r in rows:
+        n = seen[r["username"], r["course"]] = seen.get((r["username"], r["course"]), 0) + 1
+        if n <= per_course:
+            sets.append(dict(r, files=None if r["files"] is None else json.loads(r["files"])))
+    return sets
+
+
+@_timed
+def claim_warm(username, course, kind, key, size, claim_timeout):
+    """Id of a new claim on a pool slot for `key`, or None if the pool
+    already holds (or is generating) `size` entries."""
+    now = time.time()
+    with transaction() as conn:
+        conn.execute(
+            "DELETE FROM warm_pool WHERE username = ? AND course = ? AND kind = ? AND key = ?"
+            " AND payload IS NULL AND created < ?",
+            (username, course, kind, key, now - claim_timeout),
+        )
+        count = conn.execute(
+            "SELECT COUNT(*) FROM warm_pool WHERE username = ? AND course = ? AND kind = ? AND key = ?",
+            (username, course, kind, key),
+        ).fetchone()[0]
+        if count >= size:
+            return None
+        cur = conn.execute(
+            "INSERT INTO warm_pool (username, course, kind, key, created) VALUES (?, ?, ?, ?, ?)",
+            (username, course, kind, key, now),
+        )
+        return cur.lastrowid
+
+
+@_timed
+def fill_warm(claim_id, payload):
+    """Stores a generated result under its claim. Returns False if the claim
+    was dropped meanwhile (the course's files changed)."""
+    with transaction() as conn:
+        cur = conn.execute(
+            "UPDATE warm_pool SET payload = ?, created = ? WHERE id = ? AND payload IS NULL",
+            (json.dumps(payload), time.time(), claim_id),
+        )
+        return cur.rowcount > 0
+
+
+@_timed
+def release_warm(claim_id):
+    with transaction() as conn:
+        conn.execute("DELETE FROM warm_pool WHERE id = ? AND payload IS NULL", (claim_id,))
+
+
+@_timed
+def take_warm(username, course, kind, key, max_age):
+    """Removes and returns the oldest ready result for `key` made within
+    `max_age` seconds, or None."""
+    with transaction() as conn:
+        row = conn.execute(
+            "SELECT id, payload FROM warm_pool WHERE username = ? AND course = ? AND kind = ? AND key = ?"
+            " AND payload IS NOT NULL AND created >= ? ORDER BY created LIMIT 1",
+            (username, course, kind, key, time.time() - max_age),
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("DELETE FROM warm_pool WHERE id = ?", (row["id"],))
+    return json.loads(row["payload"])
+
+
+@_timed
+def prune_warm(max_age, max_entries):
+    """Drops results older than `max_age` seconds, then the oldest beyond
+    `max_entries`. Returns the number removed."""
+    with transaction() as conn:
+        removed = conn.execute(
+            "DELETE FROM warm_pool WHERE payload IS NOT NULL AND created < ?", (time.time() - max_age,)
+        ).rowcount
+        removed += conn.execute(
+            "DELETE FROM warm_pool WHERE id IN (SELECT id FROM warm_pool WHERE payload IS NOT NULL"
+            " ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (max_entries,),
+        ).rowcount
+    return removed
+
+
+# ─── Todos ─────────────────────────────────────────────────────────────
+@_timed
+def list_todos(username):
+    rows = _connect().execute("SELECT text FROM todos WHERE username = ? ORDER BY id", (username,))
+    return [r["text"] for r in rows]
+
+
+@_timed
+def add_todo(username, text):
+    """Returns False if the todo already exists."""
+    with transaction() as conn:
+        cur = conn.execute("INSERT OR IGNORE INTO todos (username, text) VALUES (?, ?)", (username, text))
+        return cur.rowcount > 0
+
+
+@_timed
+def remove_todo(username, text):
+    """Returns False if the todo was not found."""
+    with transaction() as conn:
+        cur = conn.execute("DELETE FROM todos WHERE username = ? AND text = ?", (username, text))
+        return cur.rowcount > 0
+
+
+# ─── Export / import ───────────────────────────────────────────────────
+# A user's rows (or one course's) as a stream of plain records, for the
+# NDJSON bundles in transfer.py. An export reads from its own connection
+# inside one read transaction, so it sees a single consistent snapshot
+# however long the stream takes, and never leaves a transaction open on
+# the request thread's connection. A file is a "file" record followed by
+# its payload as "segment" records: one per stored page or block of text,
+# or a single one carrying base64 PNG data for an image.
+IMPORT_BATCH = int(os.getenv("IMPORT_BATCH_RECORDS", "500"))
+RECORD_TYPES = {"file": "files", "card": "cards", "summary": "summaries", "quiz": "quizzes", "todo": "todos"}
+
+
+def iter_records(username, course=None):
+    """Yields the user's files, cards, summaries and quizzes, then todos;
+    with `course`, only that course's rows and no todos."""
+    _connect()  # brings the schema up to date
+    where, args = ("username = ?", (username,)) if course is None else \
+        ("username = ? AND course = ?", (username, course))
+    conn = sqlite3.connect(DB, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute("BEGIN")
+        for f in conn.execute(f"SELECT * FROM files WHERE {where} ORDER BY id", args):
+            record = {"type": "file", "course": f["course"], "name": f["name"], "kind": f["kind"],
+                      "size": f["size"], "pages": f["pages"]}
+            if f["kind"] == "image":
+                yield dict(record, segments=1)
+                yield {"type": "segment", "data": base64.b64encode(blobstore.get(f["blob"])).decode()}
+                continue
+            yield dict(record, segments=len(blobstore.segments(f["blob"])))
+            for text in blobstore.iter_segments(f["blob"]):
+                yield {"type": "segment", "text": text}
+        for r in conn.execute(f"SELECT course, data FROM cards WHERE {where} ORDER BY course, id", args):
+            yield {"type": "card", "course": r["course"], "card": json.loads(r["data"])}
+        for c, entry in _iter_archived(conn, where, args, "summary"):
+            yield dict(entry, type="summary", course=c)
+        for r in conn.execute(f"SELECT course, summary FROM summaries WHERE {where} ORDER BY id", args):
+            yield {"type": "summary", "course": r["course"], "summary": r["summary"]}
+        for c, entry in _iter_archived(conn, where, args, "quiz"):
+            yield dict(entry, type="quiz", course=c)
+        for r in conn.execute(f"SELECT * FROM quizzes WHERE {where} ORDER BY id", args):
+            yield {"type": "quiz", "course": r["course"], "timestamp": r["timestamp"],
+                   "files": json.loads(r["files"]), "questions": json.loads(r["questions"])}
+        if course is None:
+            for r in conn.execute("SELECT text FROM todos WHERE username = ? ORDER BY id", (username,)):
+                yield {"type": "todo", "text": r["text"]}
+    finally:
+        conn.close()
+
+
+def _next_segment(records):
+    r = next(records, None)
+    if r is None or r.get("type") != "segment":
+        raise ValueError("File record is not followed by its segments")
+    return r
+
+
+def _import_payload(record, records):
+    # Written to the blob store as it is read; only the metadata waits in
+    # the batch. gc() leaves fresh blobs alone until the batch commits.
+    if record["kind"] == "image":
+        raw = base64.b64decode(_next_segment(records)["data"])
+        return {"blob": blobstore.put(raw, compress=False), "size": len(raw)}
+    if record["kind"] != "text":
+        raise ValueError(f"Unknown file kind {record['kind']!r}")
+    writer = blobstore.BlobWriter()
+    try:
+        for _ in range(record["segments"]):
+            writer.write_segment(_next_segment(records)["text"])
+        digest, size, _ = writer.finish()
+    except BaseException:
+        writer.abort()
+        raise
+    return {"blob": digest, "size": size}
+
+
+def _apply_records(username, batch, course, counts):
+    with transaction() as conn:
+        next_ids, history = {}, set()
+        for r in batch:
+            kind, target = r["type"], course or r.get("course", "")
+            if kind == "file":
+                _put_file(conn, username, target, {"name": r["name"], "kind": r["kind"], "blob": r["blob"],
+                                                   "size": r["size"], "pages": r.get("pages")})
+            elif kind == "card":
+                if target not in next_ids:
+                    next_ids[target] = conn.execute(
+                        "SELECT COALESCE(MAX(id), 0) + 1 FROM cards WHERE username = ? AND course = ?",
+                        (username, target),
+                    ).fetchone()[0]
+                _insert_cards(conn, username, target, [dict(r["card"], id=next_ids[target])])
+                next_ids[target] += 1
+            elif kind == "summary":
+                _insert_summary(conn, username, target, r["summary"])
+                history.add((target, kind))
+            elif kind == "quiz":
+                _insert_quiz(conn, username, target, r.get("timestamp", ""), r.get("files", []), r["questions"])
+                history.add((target, kind))
+            else:
+                conn.execute("INSERT OR IGNORE INTO todos (username, text) VALUES (?, ?)", (username, r["text"]))
+            counts[RECORD_TYPES[kind]] += 1
+        for target, kind in history:
+            _enforce_retention(conn, username, target, kind, HISTORY_ARCHIVE_SLACK)
+
+
+@_timed
+def import_records(username, records, course=None, batch_size=IMPORT_BATCH):
+    """Adds exported records (see iter_records) to `username`'s data, into
+    `course` if given or else each record's own course.
+
+    Records are committed every `batch_size`, so memory stays bounded by
+    the batch however long the stream is; batches committed before an
+    error are kept. Files replace same-named ones, cards get fresh ids
+    after the course's current maximum, known todos are skipped, and
+    summaries and quizzes are appended (subject to history retention).
+    Returns counts per record type.
+    """
+    counts = dict.fromkeys(RECORD_TYPES.values(), 0)
+    records, batch = iter(records), []
+    for r in records:
+        kind = r.get("type")
+        if kind not in RECORD_TYPES:
+            raise ValueError(f"Unexpected record type {kind!r}")
+        if kind == "file":
+            r = dict(r, **_import_payload(r, records))
+        batch.append(r)
+        if len(batch) >= batch_size:
+            _apply_records(username, batch, course, counts)
+            batch = []
+    if batch:
+        _apply_records(username, batch, course, counts)
+    return counts
+
+
+# ─── Compaction ────────────────────────────────────────────────────────
+# Online maintenance that never holds the write lock for long: every step
+# below is its own short transaction, with a pause in between so request
+# writes interleave. Applies history retention to courses already over
+# their limit, drops expired upload jobs, merges the /ask index's FTS segments (many small segments
+# slow every search), hands free pages back to the filesystem and
+# checkpoints the WAL. Databases created before incremental auto-vacuum
+# need one offline `python storage.py vacuum` for the page step to apply.
+COMPACT_PAUSE_SECONDS = float(os.getenv("COMPACT_PAUSE_SECONDS", "0.05"))
+FTS_MERGE_PAGES = 256
+VACUUM_PAGES = 512
+
+
+def compact(pause=COMPACT_PAUSE_SECONDS):
+    """Runs one compaction pass; returns counts of the work done."""
+    conn = _connect()
+    done = {"archived": 0, "jobs_expired": 0, "fts_merges": 0, "pages_freed": 0}
+    for kind, table in _HISTORY_TABLES.items():
+        keep = HISTORY_KEEP[kind]
+        if keep <= 0:
+            continue
+        over = conn.execute(
+            f"SELECT username, course FROM {table} GROUP BY username, course HAVING COUNT(*) > ?", (keep,)
+        ).fetchall()
+        for r in over:
+            with transaction() as tx:
+                done["archived"] += _enforce_retention(tx, r["username"], r["course"], kind, 0)
+            time.sleep(pause)
+
+    with transaction() as tx:
+        done["jobs_expired"] = _expire_jobs(tx)
+    time.sleep(pause)
+
+    more = True
+    while more:
+        with transaction() as tx:
+            more = retrieval.merge(tx, FTS_MERGE_PAGES)
+        done["fts_merges"] += 1
+        time.sleep(pause)
+
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        while free := conn.execute("PRAGMA freelist_count").fetchone()[0]:
+            # executescript() steps the pragma to completion (execute() stops
+            # after one page); it runs as its own short write transaction.
+            conn.executescript(f"PRAGMA incremental_vacuum({VACUUM_PAGES});")
+            done["pages_freed"] += min(free, VACUUM_PAGES)
+            time.sleep(pause)
+
+    conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+    with transaction() as tx:
+        tx.execute("PRAGMA optimize")
+    return done
+
+
+def compact_if_due(interval):
+    """Runs compact() unless a pass started (in any process) within
+    `interval` seconds. Returns its result, or None if not due."""
+    with transaction() as conn:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'compacted_at'").fetchone()
+        if row and time.time() - float(row["value"]) < interval:
+            return None
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('compacted_at', ?)", (str(time.time()),))
+    return compact()
+
+
+def vacuum():
+    """Offline full rebuild: switches the database to incremental
+    auto-vacuum and rewrites it. Blocks all writers while it runs."""
+    conn = _connect()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) >= 2 and sys.argv[1] == "migrate":
+        print(f"Migrated {migrate_json(sys.argv[2] if len(sys.argv) > 2 else None)} users into {DB}.")
+    elif len(sys.argv) == 2 and sys.argv[1] == "gc":
+        print(f"Removed {collect_garbage()} unreferenced blobs from {blobstore.BLOB_DIR}.")
+    elif len(sys.argv) == 2 and sys.argv[1] == "compact":
+        print(f"Compacted {DB}: {compact()}")
+    elif len(sys.argv) == 2 and sys.argv[1] == "vacuum":
+        vacuum()
+        print(f"Rebuilt {DB}.")
+    else:
+        print("usage: python storage.py migrate [study_data.json] | gc | compact | vacuum")
@@ -0,0 +1,79 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from retrieval import chunk_text
+
+# ─── Map-reduce summarization ──────────────────────────────────────────
+# Instead of one giant prompt, each document is split into chunks that are
+# summarized concurrently (map), and multi-chunk documents are then merged
+# into a single "**Title**\nSummary" section (reduce). Documents run in
+# parallel, so wall-clock time tracks the slowest document rather than
+# the sum of all of them. A semaphore caps this request's in-flight LLM
+# calls; retries and the global per-model limit are handled in llm.py.
+CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", "40000"))
+CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+# Above this many characters of selected text, /summarize switches to
+# map-reduce even if the request did not ask for it.
+SINGLE_PASS_CHARS = int(os.getenv("SUMMARY_SINGLE_PASS_CHARS", "200000"))
+
+
+def _document_prompt(name, text):
+    return (
+        "You are a study assistant. For the document below, first invent a clear, concise title based on its content, "
+        "then write a brief summary. Format **exactly** like this:\n\n"
+        "**<Title for the Document>**\nSummary of the document...\n\n"
+        f"---\nDOCUMENT FILENAME: {name}\n\n{text}\n"
+    )
+
+
+def _part_prompt(name, index, count, text):
+    return (
+        f"You are a study assistant. Below is part {index} of {count} of the document '{name}'. "
+        "Summarize the key concepts, definitions and facts in this part concisely. "
+        "Do not add a title.\n\n"
+        f"{text}\n"
+    )
+
+
+def _reduce_prompt(name, partials):
+    parts = "\n\n".join(f"PART {i}:\n{p}" for i, p in enumerate(partials, start=1))
+    return (
+        f"You are a study assistant. Below are summaries of consecutive parts of the document '{name}'. "
+        "First invent a clear, concise title for the whole document, then combine the parts into one brief summary. "
+        "Format **exactly** like this:\n\n"
+        "**<Title for the Document>**\nSummary of the document...\n\n"
+        f"{parts}\n"
+    )
+
+
+def summarize_documents(docs, complete, concurrency=CONCURRENCY):
+    """Yields one "**Title**\\nSummary" section per (name, text) document, in order.
+
+    `complete(prompt)` is called for every chunk and for every merge; a
+    section is yielded as soon as it and all earlier ones are done.
+    """
+    gate = threading.BoundedSemaphore(max(1, concurrency))
+
+    def call(prompt):
+        with gate:
+            return complete(prompt)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as parts_pool:
+
+        def summarize_one(name, text):
+            chunks = chunk_text(text, CHUNK_CHARS, 0) or [""]
+            if len(chunks) == 1:
+                return call(_document_prompt(name, chunks[0])).strip()
+            partials = list(parts_pool.map(
+                lambda item: call(_part_prompt(name, item[0], len(chunks), item[1])),
+                enumerate(chunks, start=1),
+            ))
+            return call(_reduce_prompt(name, partials)).strip()
+
+        # Document threads only wait on their chunks (and run the reduce
+        # call), so they never starve the chunk pool.
+        with ThreadPoolExecutor(max_workers=max(1, min(len(docs), concurrency))) as docs_pool:
+            futures = [docs_pool.submit(summarize_one, name, text) for name, text in docs]
+            for future in futures:
+                yield future.result()
@@ -0,0 +1,138 @@
+import io
+import os
+import sys
+import gzip
+import json
+import zlib
+import argparse
+import datetime
+
+import storage
+
+# ─── Bulk export / import ──────────────────────────────────────────────
+# A user's (or one course's) data as NDJSON: a header line, then one JSON
+# record per line as produced by storage.iter_records(). Both directions
+# stream: export encodes (and optionally gzips) records as they are read
+# from the store, import decodes line by line and hands records to
+# storage.import_records(), which commits them in bounded batches. Memory
+# use is one output chunk or one line, never the whole bundle.
+FORMAT = "wisebud-export"
+VERSION = 1
+CHUNK_BYTES = 64 * 1024
+# Longest accepted line: one text segment, or one image as base64.
+MAX_LINE_CHARS = int(os.getenv("IMPORT_MAX_LINE_CHARS", str(64 * 1024 * 1024)))
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+def _lines(username, course):
+    header = {"type": "header", "format": FORMAT, "version": VERSION, "username": username,
+              "course": course, "exported": datetime.datetime.now().isoformat()}
+    yield json.dumps(header) + "\n"
+    for record in storage.iter_records(username, course):
+        yield json.dumps(record) + "\n"
+
+
+def dump(username, course=None, compress=False):
+    """Yields the export bundle as byte chunks of about CHUNK_BYTES, gzipped
+    if `compress`."""
+    gz = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buf, size = [], 0
+    for line in _lines(username, course):
+        data = line.encode("utf-8")
+        buf.append(gz.compress(data) if gz else data)
+        size += len(data)
+        if size >= CHUNK_BYTES:
+            yield b"".join(buf)
+            buf, size = [], 0
+    if gz:
+        buf.append(gz.flush())
+    yield b"".join(buf)
+
+
+class _Raw(io.RawIOBase):
+    # Adapts any object with read(n) (a WSGI input, a pipe) for BufferedReader.
+    def __init__(self, stream):
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self._stream.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def load(stream):
+    """Opens a bundle read from a binary stream, gzipped or not (detected
+    from the first bytes). Returns (header, records), where records is a
+    generator over the remaining lines. Raises ValueError on a malformed
+    bundle."""
+    buffered = io.BufferedReader(_Raw(stream), CHUNK_BYTES)
+    if buffered.peek(2)[:2] == _GZIP_MAGIC:
+        buffered = gzip.GzipFile(fileobj=buffered)
+    text = io.TextIOWrapper(buffered, encoding="utf-8")
+
+    try:
+        header = json.loads(_readline(text))
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get("format") != FORMAT:
+        raise ValueError("Not a Wisebud export")
+    if header.get("version", 0) > VERSION:
+        raise ValueError(f"Unsupported export version {header.get('version')}")
+    return header, _records(text)
+
+
+def _readline(text):
+    try:
+        return text.readline(MAX_LINE_CHARS)
+    except (gzip.BadGzipFile, zlib.error, EOFError):
+        raise ValueError("Corrupt or truncated gzip data") from None
+
+
+def _records(text):
+    for number, line in enumerate(iter(lambda: _readline(text), ""), start=2):
+        if not line.endswith("\n") and len(line) >= MAX_LINE_CHARS:
+            raise ValueError(f"Line {number} is longer than {MAX_LINE_CHARS} characters")
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Line {number} is not valid JSON") from None
+        if not isinstance(record, dict):
+            raise ValueError(f"Line {number} is not a record")
+        yield record
+
+
+def import_stream(username, stream, course=None):
+    """Imports a bundle from a binary stream into `username` (by default the
+    user it was exported from); returns counts per record type."""
+    header, records = load(stream)
+    return storage.import_records(username or header.get("username"), records, course=course)
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser(description="Export or import Wisebud study data as NDJSON.")
+    sub = p.add_subparsers(dest="command", required=True)
+    exp = sub.add_parser("export", help="write a user's data (or one course) to a bundle")
+    exp.add_argument("username")
+    exp.add_argument("--course")
+    exp.add_argument("-o", "--output", default="-", help="file to write, or - for stdout (default)")
+    exp.add_argument("--gzip", action="store_true", help="compress (implied by a .gz output name)")
+    imp = sub.add_parser("import", help="add a bundle's records to a user")
+    imp.add_argument("input", help="bundle to read, or - for stdin; gzip is detected")
+    imp.add_argument("--user", help="target user (default: the user the bundle was exported from)")
+    imp.add_argument("--course", help="put everything into this course instead of the original ones")
+    args = p.parse_args()
+
+    if args.command == "export":
+        out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+        with out:
+            for chunk in dump(args.username, args.course, args.gzip or args.output.endswith(".gz")):
+                out.write(chunk)
+    else:
+        src = sys.stdin.buffer if args.input == "-" else open(args.input, "rb")
+        with src:
+            print(json.dumps(import_stream(args.user, src, args.course)))
@@ -0,0 +1,143 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+
+import admission
+import flashcards
+import jobs
+import llm
+import metrics
+import quizzes
+import storage
+
+# ─── Warm pool ─────────────────────────────────────────────────────────
+# Quizzes and card batches for a given file selection are interchangeable,
+# so a background thread generates a few ahead of time and /generate-quiz
+# and /generate-cards hand out a ready one instead of waiting on the
+# model. What to keep warm is learned from use: every request marks its
+# selection (files, model, instructions), and uploading or deleting files
+# marks the whole course. A selection asked for by nobody within
+# SET_TTL_SECONDS is dropped, and only the MAX_SETS most recent per
+# course are filled.
+#
+# Results are stored in the study DB (see storage.py), so any worker can
+# hand out what another generated. They expire after TTL_SECONDS, the
+# oldest are evicted beyond MAX_ENTRIES, and a course's pool is dropped
+# whenever its files change. Refills run only while this process is idle:
+# no uploads extracting and no requests queued for an LLM slot.
+#
+#   WARM_POOL_QUIZZES=2 / WARM_POOL_CARD_BATCHES=1   entries per selection (0 disables a kind)
+ENABLED = os.getenv("WARM_POOL", "1") != "0"
+SIZES = {
+    "quiz": int(os.getenv("WARM_POOL_QUIZZES", "2")),
+    "cards": int(os.getenv("WARM_POOL_CARD_BATCHES", "1")),
+}
+TTL_SECONDS = int(os.getenv("WARM_POOL_TTL_SECONDS", str(24 * 3600)))
+SET_TTL_SECONDS = int(os.getenv("WARM_POOL_SET_TTL_SECONDS", str(3 * 24 * 3600)))
+MAX_SETS = int(os.getenv("WARM_POOL_MAX_SETS", "4"))
+MAX_ENTRIES = int(os.getenv("WARM_POOL_MAX_ENTRIES", "1000"))
+INTERVAL_SECONDS = float(os.getenv("WARM_POOL_INTERVAL_SECONDS", "15"))
+# A claim older than this is assumed to belong to a worker that died.
+CLAIM_TIMEOUT_SECONDS = 10 * 60
+# A selection whose generation failed is not retried for this long.
+FAILURE_BACKOFF_SECONDS = 5 * 60
+
+_GENERATORS = {
+    "quiz": (quizzes.generate_quiz, quizzes.system_prompt),
+    "cards": (flashcards.generate_cards, flashcards.system_prompt),
+}
+
+log = logging.getLogger(__name__)
+_lock = threading.Lock()
+_wake = threading.Event()
+_thread = None
+_default_model = None
+_failed = {}  # warm set key -> time of the last failed generation
+
+
+def fingerprint(files, model, instructions):
+    """Pool key for a selection: the files' names and content digests, in
+    name order, plus model and instructions."""
+    payload = json.dumps([sorted((f["name"], f["blob"]) for f in files), model, instructions])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def take(kind, username, course, files, model, instructions):
+    """A ready result for exactly these files, model and instructions, or
+    None. Either way the selection is remembered and a refill requested."""
+    if not ENABLED or not SIZES[kind]:
+        return None
+    storage.note_warm_set(username, course, kind, sorted(f["name"] for f in files), model, instructions)
+    payload = storage.take_warm(username, course, kind, fingerprint(files, model, instructions), TTL_SECONDS)
+    metrics.WARM_POOL.inc(kind=kind, outcome="hit" if payload is not None else "miss")
+    _wake.set()
+    return payload
+
+
+def _idle():
+    return jobs.pending() == 0 and admission.idle()
+
+
+def _fill_one():
+    # Generates one missing entry; returns False once nothing needs filling.
+    now = time.time()
+    for key, failed_at in list(_failed.items()):
+        if now - failed_at >= FAILURE_BACKOFF_SECONDS:
+            del _failed[key]
+    for s in storage.warm_sets(SET_TTL_SECONDS, MAX_SETS):
+        size = SIZES.get(s["kind"], 0)
+        if not size or s["key"] in _failed:
+            continue
+        files = storage.get_files(s["username"], s["course"], s["files"])
+        if not files:
+            continue
+        model = s["model"] or _default_model
+        key = fingerprint(files, model, s["instructions"])
+        claim = storage.claim_warm(s["username"], s["course"], s["kind"], key, size, CLAIM_TIMEOUT_SECONDS)
+        if claim is None:
+            continue
+
+        generate, system_prompt = _GENERATORS[s["kind"]]
+        try:
+            payload = generate(
+                [storage.file_text(f) for f in files],
+                lambda prompt: llm.complete(model, system_prompt(s["instructions"]), prompt, endpoint="warm_pool"),
+            )
+        except Exception:
+            log.exception("Warm pool generation failed for %s/%s", s["username"], s["course"])
+            storage.release_warm(claim)
+            _failed[s["key"]] = time.time()
+            metrics.WARM_POOL.inc(kind=s["kind"], outcome="failed")
+            continue
+        if storage.fill_warm(claim, payload):
+            metrics.WARM_POOL.inc(kind=s["kind"], outcome="generated")
+        return True
+    return False
+
+
+def _run():
+    while True:
+        _wake.wait(INTERVAL_SECONDS)
+        _wake.clear()
+        try:
+            storage.prune_warm(TTL_SECONDS, MAX_ENTRIES)
+            while _idle() and _fill_one():
+                pass
+        except Exception:
+            log.exception("Warm pool refill failed")
+
+
+def start(default_model):
+    """Starts this process's refill thread (once); `default_model` fills
+    selections that did not name one."""
+    global _thread, _default_model
+    if not ENABLED:
+        return
+    with _lock:
+        _default_model = default_model
+        if _thread is None:
+            _thread = threading.Thread(target=_run, name="warm-pool", daemon=True)
+            _thread.start()
@@ -0,0 +1,124 @@
+"""Local stand-in for the OpenAI chat completions API.
+
+Serves POST /v1/chat/completions (plain and stream=true) with configurable
+latency and response size, so the backend can be benchmarked without
+network access or API cost. Point the app at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+    python bench/fake_openai.py --port 8765 --latency-ms 800 --response-chars 2000
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOpenAI:
+    def __init__(self, latency_ms=200, jitter_ms=50, response_chars=1500, stream_chunks=20):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.response_chars = response_chars
+        self.stream_chunks = stream_chunks
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _content(self, prompt):
+        # Mirror the shapes app.py parses: JSON arrays for flashcards and
+        # quizzes, "**Title**\nSummary" text for everything else.
+        n = self.response_chars
+        if "flashcard" in prompt:
+            cards, size = [], 2
+            while size < n:
+                i = len(cards)
+                cards.append({"question": f"Synthetic question {i} {random.random():.6f}?",
+                              "answer": f"Synthetic answer {i}."})
+                size += 80
+            return json.dumps(cards)
+        if "multiple-choice" in prompt:
+            return json.dumps([
+                {"question": f"Question {i}?", "options": {k: f"Option {k}" for k in "ABCD"}, "correctAnswer": "A"}
+                for i in range(10)
+            ])
+        body = ("lorem ipsum dolor sit amet " * (n // 27 + 1))[:n]
+        return f"**Synthetic Title**\n{body}"
+
+    def _sleep(self):
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        time.sleep(max(0.0, delay) / 1000)
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                with fake._lock:
+                    fake.calls += 1
+                prompt = body.get("messages", [{}])[-1].get("content", "")
+                content = fake._content(prompt)
+                usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                         "total_tokens": (len(prompt) + len(content)) // 4}
+                base = {"id": "chatcmpl-fake", "created": int(time.time()), "model": body.get("model", "fake")}
+
+                if not body.get("stream"):
+                    fake._sleep()
+                    payload = json.dumps({
+                        **base, "object": "chat.completion", "usage": usage,
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": content}}],
+                    }).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+
+                # Streaming: the configured latency is spread across the chunks.
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                step = max(1, len(content) // fake.stream_chunks)
+                per_chunk = fake.latency_ms / 1000 / max(1, fake.stream_chunks)
+                for i in range(0, len(content), step):
+                    time.sleep(per_chunk)
+                    chunk = {**base, "object": "chat.completion.chunk",
+                             "choices": [{"index": 0, "delta": {"content": content[i:i + step]}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                final = {**base, "object": "chat.completion.chunk", "usage": usage,
+                         "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode())
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+    def serve(self, host="127.0.0.1", port=0):
+        """Starts the server on a daemon thread and returns it; server.server_port is the bound port."""
+        server = ThreadingHTTPServer((host, port), self.handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=200)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--response-chars", type=int, default=1500)
+    args = parser.parse_args()
+    fake = FakeOpenAI(args.latency_ms, args.jitter_ms, args.response_chars)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), fake.handler())
+    print(f"Fake OpenAI listening on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
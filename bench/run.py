@@ -0,0 +1,405 @@
+"""Load-test and benchmark harness for the Wisebud backend.
+
+Seeds a throwaway data directory with synthetic users, courses, files and
+cards, starts the Flask app on a local port against a fake OpenAI server
+(bench/fake_openai.py), then drives each endpoint concurrently and reports
+p50/p95/p99 latency, throughput and peak RSS per endpoint.
+
+    python bench/run.py --users 100 --cards-per-course 10000 --requests 200
+    python bench/run.py --save-baseline main
+    python bench/run.py --compare main          # exits 1 on p95 regressions
+
+Results can be saved as named baselines under bench/baselines/ and later
+runs compared against them.
+"""
+import os
+import sys
+import json
+import time
+import logging
+import random
+import argparse
+import datetime
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.join(HERE, "..", "backend")
+BASELINES = os.path.join(HERE, "baselines")
+
+ENDPOINTS = [
+    "list-files", "get-card", "answer-card", "get-cards", "answer-cards", "ask",
+    "upload", "summarize", "generate-cards", "generate-quiz",
+]
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    scale = p.add_argument_group("data scale")
+    scale.add_argument("--users", type=int, default=10)
+    scale.add_argument("--courses-per-user", type=int, default=2)
+    scale.add_argument("--files-per-course", type=int, default=3)
+    scale.add_argument("--file-kb", type=int, default=50, help="size of each synthetic document")
+    scale.add_argument("--cards-per-course", type=int, default=1000)
+    load = p.add_argument_group("load")
+    load.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated subset to drive")
+    load.add_argument("--requests", type=int, default=100, help="requests per endpoint")
+    load.add_argument("--concurrency", type=int, default=8)
+    load.add_argument("--allow-cache", action="store_true", help="let generation endpoints hit the LLM cache")
+    load.add_argument("--admission", action="store_true",
+                      help="keep per-user rate limits and fair queueing on (off by default to measure raw capacity)")
+    load.add_argument("--warm-pool", action="store_true",
+                      help="keep background quiz/card pre-generation on (off by default; it competes for the fake LLM)")
+    llm = p.add_argument_group("fake OpenAI")
+    llm.add_argument("--latency-ms", type=float, default=200)
+    llm.add_argument("--jitter-ms", type=float, default=50)
+    llm.add_argument("--response-chars", type=int, default=1500)
+    out = p.add_argument_group("baselines")
+    out.add_argument("--save-baseline", metavar="NAME")
+    out.add_argument("--compare", metavar="NAME")
+    out.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 slowdown before flagging (0.2 = 20%%)")
+    out.add_argument("--json", metavar="PATH", help="also write raw results to PATH")
+    return p.parse_args(argv)
+
+
+# ─── Synthetic data ────────────────────────────────────────────────────
+WORDS = ("cell membrane enzyme protein energy mitochondria nucleus ribosome gene "
+         "photosynthesis equilibrium entropy derivative integral vector matrix theorem proof "
+         "market supply demand inflation policy revolution empire treaty").split()
+
+
+def synthetic_text(rng, chars):
+    words = []
+    size = 0
+    while size < chars:
+        w = rng.choice(WORDS)
+        words.append(w)
+        size += len(w) + 1
+        if len(words) % 15 == 0:
+            words.append(".\n")
+    return " ".join(words)[:chars]
+
+
+def seed(storage, blobstore, args, rng):
+    """Writes synthetic data straight through the storage layer; returns [(user, course, files)]."""
+    now = time.time()
+    targets = []
+    for u in range(args.users):
+        username = f"user{u:05d}"
+        for c in range(args.courses_per_user):
+            course = f"course{c:03d}"
+            entries = []
+            for f in range(args.files_per_course):
+                text = synthetic_text(rng, args.file_kb * 1024)
+                entries.append({"name": f"notes{f:03d}.txt", "kind": "text", "blob": blobstore.put_text(text),
+                                "size": len(text), "pages": None, "text": text})
+            storage.add_files(username, course, entries)
+            for start in range(0, args.cards_per_course, 1000):
+                batch = []
+                for i in range(start, min(args.cards_per_course, start + 1000)):
+                    due = now + rng.uniform(-30, 30) * 86400
+                    batch.append({
+                        "question": f"What is {rng.choice(WORDS)} #{i}?",
+                        "answer": synthetic_text(rng, 60),
+                        "review_count": rng.randint(0, 8),
+                        "interval": rng.randint(1, 60),
+                        "ease_factor": round(rng.uniform(1.3, 3.0), 2),
+                        "next_review": datetime.datetime.fromtimestamp(due).isoformat(),
+                    })
+                storage.add_cards(username, course, batch)
+            targets.append((username, course, [e["name"] for e in entries]))
+    return targets
+
+
+# ─── Measurement ───────────────────────────────────────────────────────
+def rss_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class RssSampler:
+    """Samples this process's RSS every few ms; .peak_kb after stop()."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak_kb = rss_kb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_kb = max(self.peak_kb, rss_kb())
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+# ─── HTTP driver ───────────────────────────────────────────────────────
+def http(base, method, path, username, body=None, files=None, fields=None):
+    headers = {"Username": username}
+    data = None
+    if files is not None:
+        boundary = f"----bench{random.getrandbits(64):x}"
+        parts = []
+        for key, value in (fields or {}).items():
+            parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n\r\n{value}\r\n'.encode())
+        for name, content in files:
+            parts.append(
+                f'--{boundary}\r\nContent-Disposition: form-data; name="files"; filename="{name}"\r\n'
+                f"Content-Type: application/octet-stream\r\n\r\n".encode() + content + b"\r\n"
+            )
+        parts.append(f"--{boundary}--\r\n".encode())
+        data = b"".join(parts)
+        headers["Content-Type"] = f"multipart/form-data; boundary={boundary}"
+    elif body is not None:
+        data = json.dumps(body).encode()
+        headers["Content-Type"] = "application/json"
+    req = urllib.request.Request(base + path, data=data, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(req, timeout=300) as res:
+            return res.status, res.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def scenarios(base, targets, args):
+    """One request function per endpoint; each returns the final HTTP status."""
+    no_cache = not args.allow_cache
+    local = threading.local()
+
+    def rng():
+        if not hasattr(local, "rng"):
+            local.rng = random.Random(threading.get_ident())
+        return local.rng
+
+    def pick():
+        return rng().choice(targets)
+
+    def q(course):
+        return "?course=" + urllib.request.quote(course)
+
+    def list_files():
+        user, course, _ = pick()
+        return http(base, "GET", "/list-files" + q(course), user)[0]
+
+    def get_card():
+        user, course, _ = pick()
+        return http(base, "GET", "/get-card" + q(course), user)[0]
+
+    def answer_card():
+        user, course, _ = pick()
+        card_id = rng().randint(1, max(1, args.cards_per_course))
+        body = {"course": course, "cardId": card_id, "quality": rng().choice([2, 3, 5])}
+        return http(base, "POST", "/answer-card", user, body)[0]
+
+    def get_cards():
+        user, course, _ = pick()
+        return http(base, "GET", "/get-cards" + q(course) + "&limit=20", user)[0]
+
+    def answer_cards():
+        # One flush from the flashcard page: ten grades in a single request.
+        user, course, _ = pick()
+        grades = [{"cardId": rng().randint(1, max(1, args.cards_per_course)), "quality": rng().choice([2, 3, 5])}
+                  for _ in range(10)]
+        return http(base, "POST", "/answer-cards", user, {"course": course, "grades": grades})[0]
+
+    def ask():
+        user, course, _ = pick()
+        query = " ".join(rng().sample(WORDS, 3)) + "?"
+        return http(base, "POST", "/ask", user, {"course": course, "query": query})[0]
+
+    def upload():
+        # End-to-end: enqueue, then poll the extraction job until it is done.
+        user, course, _ = pick()
+        text = synthetic_text(rng(), args.file_kb * 1024).encode()
+        status, raw = http(base, "POST", "/upload", user, files=[(f"upload{rng().random():.8f}.txt", text)],
+                           fields={"course": course})
+        if status != 202:
+            return status
+        job_id = json.loads(raw)["job_id"]
+        while True:
+            status, raw = http(base, "GET", f"/upload-status/{job_id}", user)
+            if status != 200 or json.loads(raw)["status"] == "done":
+                return status
+            time.sleep(0.01)
+
+    def generation(path):
+        def call():
+            user, course, files = pick()
+            body = {"course": course, "filenames": rng().sample(files, min(2, len(files))), "no_cache": no_cache}
+            return http(base, "POST", path, user, body)[0]
+        return call
+
+    return {
+        "list-files": list_files,
+        "get-card": get_card,
+        "answer-card": answer_card,
+        "get-cards": get_cards,
+        "answer-cards": answer_cards,
+        "ask": ask,
+        "upload": upload,
+        "summarize": generation("/summarize"),
+        "generate-cards": generation("/generate-cards"),
+        "generate-quiz": generation("/generate-quiz"),
+    }
+
+
+def run_phase(fn, requests, concurrency):
+    latencies, errors = [], 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        start = time.perf_counter()
+        status = fn()
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            if status >= 400:
+                errors += 1
+
+    rss_before = rss_kb()
+    with RssSampler() as sampler:
+        wall = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(requests)))
+        wall = time.perf_counter() - wall
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "throughput_rps": requests / wall if wall else 0.0,
+        "peak_rss_mb": sampler.peak_kb / 1024,
+        "rss_growth_mb": (sampler.peak_kb - rss_before) / 1024,
+    }
+
+
+# ─── Reporting ─────────────────────────────────────────────────────────
+def print_table(results):
+    print(f"{'endpoint':<16}{'reqs':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'req/s':>9}{'peak MB':>9}{'+MB':>7}")
+    for name, r in results.items():
+        print(f"{name:<16}{r['requests']:>6}{r['errors']:>5}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+              f"{r['p99_ms']:>10.1f}{r['throughput_rps']:>9.1f}{r['peak_rss_mb']:>9.1f}{r['rss_growth_mb']:>7.1f}")
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"\nvs. baseline '{baseline['name']}' ({baseline['created']}):")
+    for name, r in results.items():
+        base = baseline["results"].get(name)
+        if not base or not base["p95_ms"]:
+            continue
+        change = r["p95_ms"] / base["p95_ms"] - 1
+        flag = "  REGRESSION" if change > tolerance else ""
+        print(f"  {name:<16} p95 {base['p95_ms']:>9.1f} -> {r['p95_ms']:>9.1f} ms ({change:+.0%}){flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    selected = [e.strip() for e in args.endpoints.split(",") if e.strip()]
+    unknown = set(selected) - set(ENDPOINTS)
+    if unknown:
+        sys.exit(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+    sys.path.insert(0, HERE)
+    from fake_openai import FakeOpenAI
+
+    fake = FakeOpenAI(args.latency_ms, args.jitter_ms, args.response_chars)
+    fake_server = fake.serve()
+
+    # All app state (SQLite DBs, blobs, cache) goes into a scratch directory.
+    if args.json:
+        args.json = os.path.abspath(args.json)
+    workdir = tempfile.mkdtemp(prefix="wisebud-bench-")
+    os.chdir(workdir)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{fake_server.server_port}/v1"
+    os.environ["OPENAI_API_KEY"] = "bench"
+    if not args.admission:
+        os.environ["ADMISSION"] = "0"
+    if not args.warm_pool:
+        os.environ["WARM_POOL"] = "0"
+    sys.path.insert(0, os.path.abspath(BACKEND))
+    import storage
+    import blobstore
+    import app as app_module
+    from werkzeug.serving import make_server
+
+    rng = random.Random(1234)
+    t = time.perf_counter()
+    targets = seed(storage, blobstore, args, rng)
+    print(f"Seeded {args.users} users x {args.courses_per_user} courses "
+          f"({args.files_per_course} files, {args.cards_per_course} cards each) "
+          f"in {time.perf_counter() - t:.1f}s under {workdir}")
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+
+    fns = scenarios(base, targets, args)
+    results = {}
+    for name in selected:
+        results[name] = run_phase(fns[name], args.requests, args.concurrency)
+        print(f"  {name}: done")
+    server.shutdown()
+    fake_server.shutdown()
+
+    print()
+    print_table(results)
+    print(f"\nfake OpenAI calls: {fake.calls}")
+
+    record = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("save_baseline", "compare", "json")},
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(record, f, indent=4)
+    if args.save_baseline:
+        os.makedirs(BASELINES, exist_ok=True)
+        path = os.path.join(BASELINES, f"{args.save_baseline}.json")
+        with open(path, "w") as f:
+            json.dump({"name": args.save_baseline, **record}, f, indent=4)
+        print(f"Saved baseline to {path}")
+    if args.compare:
+        with open(os.path.join(BASELINES, f"{args.compare}.json")) as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Cold-start benchmark for the Wisebud backend.
+
+Boots the app in fresh interpreters and reports, per configuration, the
+time to import and build it, its first request's latency and the
+process's RSS once up. A second table covers the upload extraction pool
+under each worker start mode (see backend/jobs.py): how long the first
+file takes once the app has been up for --settle seconds, and the
+memory each worker adds (PSS, so pages shared with the parent count
+once).
+
+    python bench/startup.py
+    python bench/startup.py --runs 10 --baseline HEAD~1   # also boot an older revision
+
+--baseline extracts backend/ as of a git revision into a scratch
+directory and boots that too, so a change's effect on startup shows up
+side by side.
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO = os.path.abspath(os.path.join(HERE, ".."))
+BACKEND = os.path.join(REPO, "backend")
+
+# Runs in the child: boot, one light request, report. Revisions without
+# create_app() are booted through their module-level app.
+BOOT = r"""
+import os, sys, json, time
+start = time.perf_counter()
+import app as app_module
+if hasattr(app_module, "create_app"):
+    blueprints = os.environ.get("BENCH_BLUEPRINTS")
+    flask_app = app_module.create_app(blueprints.split(",") if blueprints else None)
+else:
+    flask_app = app_module.app
+boot = time.perf_counter() - start
+client = flask_app.test_client()
+start = time.perf_counter()
+status = client.get("/list-todos", headers={"Username": "bench"}).status_code
+first = time.perf_counter() - start
+heavy = [m for m in ("openai", "fitz", "PIL", "numpy") if m in sys.modules]
+print(json.dumps({"boot": boot, "first": first, "status": status, "rss_kb": RSS(os.getpid()), "heavy": heavy}))
+"""
+
+# Runs in the child: boot the full app, wait, then time one extraction.
+EXTRACT = r"""
+import os, sys, json, time
+import app as app_module
+app_module.create_app()
+import jobs
+time.sleep(float(os.environ["BENCH_SETTLE"]))
+rss_kb = RSS(os.getpid())
+start = time.perf_counter()
+entry, _ = jobs._pool().submit(jobs._extract, "bench.pdf", os.environ["BENCH_PDF"]).result()
+first = time.perf_counter() - start
+workers = [PSS(pid) for pid in jobs._pool()._processes]
+print(json.dumps({"first": first, "pages": entry["pages"], "rss_kb": rss_kb, "worker_kb": workers}))
+"""
+
+PROC = r"""
+def _status(pid, path, key):
+    try:
+        with open(f"/proc/{pid}/{path}") as f:
+            for line in f:
+                if line.startswith(key):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+RSS = lambda pid: _status(pid, "status", "VmRSS:")
+PSS = lambda pid: _status(pid, "smaps_rollup", "Pss:") or RSS(pid)
+"""
+
+# A one-page PDF; MuPDF rebuilds the missing cross-reference table.
+PDF = (b"%PDF-1.4\n1 0 obj<</Type/Catalog/Pages 2 0 R>>endobj\n"
+       b"2 0 obj<</Type/Pages/Kids[3 0 R]/Count 1>>endobj\n"
+       b"3 0 obj<</Type/Page/Parent 2 0 R/MediaBox[0 0 612 792]/Contents 4 0 R"
+       b"/Resources<</Font<</F1 5 0 R>>>>>>endobj\n"
+       b"4 0 obj<</Length 44>>stream\nBT /F1 24 Tf 72 700 Td (Cold start) Tj ET\nendstream endobj\n"
+       b"5 0 obj<</Type/Font/Subtype/Type1/BaseFont/Helvetica>>endobj\n"
+       b"trailer<</Root 1 0 R>>\n%%EOF\n")
+
+POOL_MODES = {
+    "fork": {"UPLOAD_WORKER_START": "fork"},
+    "fork+preload": {"UPLOAD_WORKER_START": "fork", "UPLOAD_PRELOAD": "1"},
+    "forkserver": {"UPLOAD_WORKER_START": "forkserver"},
+    "forkserver+preload": {"UPLOAD_WORKER_START": "forkserver", "UPLOAD_PRELOAD": "1"},
+}
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--runs", type=int, default=5, help="fresh interpreters per configuration")
+    p.add_argument("--baseline", metavar="REV", help="also boot backend/ as of this git revision")
+    p.add_argument("--workers", type=int, default=2, help="UPLOAD_WORKERS for the extraction pool runs")
+    p.add_argument("--settle", type=float, default=2.0,
+                   help="seconds the app is up before the first extraction")
+    p.add_argument("--skip-pool", action="store_true", help="only measure app boot")
+    p.add_argument("--json", help="also write the results to this file")
+    return p.parse_args(argv)
+
+
+def run_child(code, backend, env, workdir):
+    env = dict(os.environ, OPENAI_API_KEY="bench", PYTHONPATH=backend, **env)
+    out = subprocess.run([sys.executable, "-W", "ignore", "-c", PROC + code], cwd=workdir, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def export_revision(rev, into):
+    archive = subprocess.run(["git", "-C", REPO, "archive", rev, "backend"], capture_output=True, check=True)
+    subprocess.run(["tar", "-x", "-C", into], input=archive.stdout, check=True)
+    return os.path.join(into, "backend")
+
+
+def measure(runs, code, backend, env):
+    # Each run gets its own data directory, so every boot is a first boot.
+    samples = []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory(prefix="wisebud-startup-") as workdir:
+            samples.append(run_child(code, backend, env, workdir))
+    return samples
+
+
+def summarize_boot(samples):
+    return {
+        "boot_ms": statistics.median(s["boot"] for s in samples) * 1000,
+        "first_request_ms": statistics.median(s["first"] for s in samples) * 1000,
+        "rss_mb": statistics.median(s["rss_kb"] for s in samples) / 1024,
+        "heavy_modules": samples[-1]["heavy"],
+    }
+
+
+def summarize_pool(samples):
+    return {
+        "first_extract_ms": statistics.median(s["first"] for s in samples) * 1000,
+        "app_rss_mb": statistics.median(s["rss_kb"] for s in samples) / 1024,
+        "worker_pss_mb": statistics.median(kb for s in samples for kb in s["worker_kb"]) / 1024,
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    boots, pools = {}, {}
+    with tempfile.TemporaryDirectory(prefix="wisebud-startup-") as scratch:
+        configs = []
+        if args.baseline:
+            configs.append((f"{args.baseline} (full)", export_revision(args.baseline, scratch), {}))
+        configs += [("full", BACKEND, {}), ("light", BACKEND, {"BENCH_BLUEPRINTS": "light"})]
+        for name, backend, env in configs:
+            boots[name] = summarize_boot(measure(args.runs, BOOT, backend, env))
+            print(f"  boot {name}: done")
+
+        if not args.skip_pool:
+            pdf = os.path.join(scratch, "bench.pdf")
+            with open(pdf, "wb") as f:
+                f.write(PDF)
+            for name, env in POOL_MODES.items():
+                env = dict(env, UPLOAD_WORKERS=str(args.workers), BENCH_SETTLE=str(args.settle), BENCH_PDF=pdf)
+                pools[name] = summarize_pool(measure(args.runs, EXTRACT, BACKEND, env))
+                print(f"  pool {name}: done")
+
+    print()
+    print(f"{'app':<24}{'boot ms':>10}{'first req ms':>14}{'RSS MB':>9}  heavy modules loaded")
+    for name, r in boots.items():
+        print(f"{name:<24}{r['boot_ms']:>10.1f}{r['first_request_ms']:>14.1f}{r['rss_mb']:>9.1f}"
+              f"  {', '.join(r['heavy_modules']) or '-'}")
+    if pools:
+        print()
+        print(f"{'extraction pool':<24}{'first file ms':>14}{'app RSS MB':>12}{'worker PSS MB':>15}")
+        for name, r in pools.items():
+            print(f"{name:<24}{r['first_extract_ms']:>14.1f}{r['app_rss_mb']:>12.1f}{r['worker_pss_mb']:>15.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "boot": boots, "pool": pools}, f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
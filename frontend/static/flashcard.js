@@ -17,6 +17,17 @@ let currentCard = null;
 // add a simple mapping from button text to SM‑2 quality scores
 const ratingMap = { hard: 2, medium: 3, easy: 5 };
 
+// Review session: cards are prefetched in batches and grades are sent back
+// in the background, so a session costs a few requests instead of two per card.
+const BATCH_SIZE = 20;   // cards per /get-cards request
+const PREFETCH_AT = 5;   // refill the queue when this few cards are left
+const FLUSH_AT = 10;     // grades buffered before an /answer-cards request
+
+let cardQueue = [];
+let pendingGrades = [];
+let flushing = null;
+let refilling = null;
+
 async function loadFiles() {
     const res = await fetch(`${API_URL}/list-files?course=${encodeURIComponent(currentCourse)}`, {
       headers: { "Username": localStorage.getItem("wisebudUser") }
@@ -118,19 +129,66 @@ async function generateCards() {
 }
 
 
-async function fetchNextCard() {
-    // NEW: pass the course as a query parameter
-    const res = await fetch(`${API_URL}/get-card?course=${encodeURIComponent(currentCourse)}`, {
-        headers: { 'Username': localStorage.getItem("wisebudUser") }
+function sendGrades(grades, keepalive = false) {
+    return fetch(`${API_URL}/answer-cards`, {
+        method: "POST",
+        keepalive,
+        headers: {
+            "Content-Type": "application/json",
+            "Username": localStorage.getItem("wisebudUser")
+        },
+        body: JSON.stringify({ course: currentCourse, grades })
+    }).then(res => {
+        if (!res.ok) throw new Error(`answer-cards failed: ${res.status}`);
     });
-    if (!res.ok) {
+}
+
+async function flushGrades() {
+    // One flush at a time; grades from a failed flush are retried with the next one.
+    while (flushing) await flushing;
+    if (!pendingGrades.length) return;
+    const grades = pendingGrades;
+    pendingGrades = [];
+    flushing = sendGrades(grades)
+        .catch(err => {
+            console.error(err);
+            pendingGrades = grades.concat(pendingGrades);
+        })
+        .finally(() => { flushing = null; });
+    await flushing;
+}
+
+function refillQueue() {
+    if (refilling) return refilling;
+    refilling = (async () => {
+        // Flush first so cards graded in this session come back rescheduled.
+        await flushGrades();
+        const res = await fetch(`${API_URL}/get-cards?course=${encodeURIComponent(currentCourse)}&limit=${BATCH_SIZE}`, {
+            headers: { 'Username': localStorage.getItem("wisebudUser") }
+        });
+        if (!res.ok) return;
+        const { cards } = await res.json();
+        // Skip cards already queued, graded but not yet flushed, or on screen
+        // ungraded. A card that was just graded and flushed may come back: in a
+        // small deck it can be the next one due.
+        const seen = new Set(cardQueue.map(c => c.id).concat(pendingGrades.map(g => g.cardId)));
+        if (currentCard) seen.add(currentCard.id);
+        cardQueue.push(...cards.filter(c => !seen.has(c.id)));
+    })().finally(() => { refilling = null; });
+    return refilling;
+}
+
+async function fetchNextCard() {
+    if (!cardQueue.length) await refillQueue();
+    if (!cardQueue.length) {
+        currentCard = null;
         questionText.textContent = 'No cards available.';
         return;
     }
 
-    const card = await res.json();
-    currentCard = card;
-    displayCard(card);
+    currentCard = cardQueue.shift();
+    displayCard(currentCard);
+    if (cardQueue.length < PREFETCH_AT) refillQueue();
 }
 
 function displayCard(card) {
@@ -158,16 +216,19 @@ perfBtns.addEventListener('click', async e => {
     const quality = parseInt(e.target.dataset.rating);
     if (!currentCard || !currentCard.id || isNaN(quality)) return;
 
-    await fetch(`${API_URL}/answer-card`, {
-        method: "POST",
-        headers: {
-            "Content-Type": "application/json",
-            "Username": localStorage.getItem("wisebudUser")
-        },
-        body: JSON.stringify({ course: currentCourse, cardId: currentCard.id, quality })
-    });
+    pendingGrades.push({ cardId: currentCard.id, quality, answered_at: new Date().toISOString() });
+    currentCard = null;
+    if (pendingGrades.length >= FLUSH_AT) flushGrades();
 
     fetchNextCard();
 });
 
+// Don't lose buffered grades when the page is closed or hidden.
+document.addEventListener('visibilitychange', () => {
+    if (document.visibilityState !== 'hidden' || !pendingGrades.length) return;
+    const grades = pendingGrades;
+    pendingGrades = [];
+    sendGrades(grades, true).catch(() => { pendingGrades = grades.concat(pendingGrades); });
+});
+
 loadFiles();
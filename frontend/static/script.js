@@ -110,9 +110,49 @@ document.addEventListener('DOMContentLoaded', () => {
     });
     const json = await res.json();
     if (!res.ok) throw new Error(json.error || 'Upload failed');
+    await waitForUploadJob(json.job_id);
     return true;
   }
 
+  // Extraction runs in the background; poll the job and refresh the file
+  // list as each file finishes. Gives up if nothing finishes for
+  // UPLOAD_STALL_MS, e.g. when the server lost the job.
+  const UPLOAD_STALL_MS = 5 * 60 * 1000;
+
+  async function waitForUploadJob(jobId) {
+    let shown = 0;
+    let finishedBefore = -1;
+    let deadline = 0;
+    while (true) {
+      const res = await fetch(`${API_URL}/upload-status/${jobId}`, {
+        headers: { "Username": localStorage.getItem("wisebudUser") }
+      });
+      const job = await res.json();
+      if (!res.ok) throw new Error(job.error || 'Upload status unavailable');
+
+      if (job.status === 'failed') throw new Error(job.error || 'Upload failed');
+
+      const finished = job.done.length + Object.keys(job.failed).length;
+      if (finished > finishedBefore) {
+        finishedBefore = finished;
+        deadline = Date.now() + UPLOAD_STALL_MS;
+      } else if (Date.now() > deadline) {
+        throw new Error('Upload is taking too long; check the file list and retry any missing files');
+      }
+      setStatus(`Processing files… ${finished}/${job.total}`);
+      if (job.done.length > shown) {
+        shown = job.done.length;
+        await displayUploadedFiles();
+      }
+      if (job.status === 'done') {
+        const failed = Object.keys(job.failed);
+        setStatus(failed.length ? `Could not process: ${failed.join(', ')}` : `${job.done.length} files uploaded.`);
+        return;
+      }
+      await new Promise(resolve => setTimeout(resolve, 1000));
+    }
+  }
+
   async function displayUploadedFiles() {
     try {
       const res = await fetch(`${API_URL}/list-files?course=${encodeURIComponent(course)}`, {
@@ -151,17 +191,16 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
-  async function askModel(q) {
+  async function askModel(q, onDelta) {
     const res = await fetch(`${API_URL}/ask`, {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
         'Username': localStorage.getItem("wisebudUser")
       },
-      body: JSON.stringify({ query: q, course })
+      body: JSON.stringify({ query: q, course, stream: true })
     });
-    const { answer, error } = await res.json();
-    if (error) throw new Error(error);
+    const { answer } = await readEventStream(res, onDelta);
     return answer;
   }
 
@@ -293,8 +332,13 @@ document.addEventListener('DOMContentLoaded', () => {
     chatLog.scrollTop = chatLog.scrollHeight;
 
     try {
-      const a = await askModel(q);
-      chatLog.value += `AI: ${a}\n\n`;
+      // Render the answer token by token as it streams in
+      chatLog.value += 'AI: ';
+      await askModel(q, delta => {
+        chatLog.value += delta;
+        chatLog.scrollTop = chatLog.scrollHeight;
+      });
+      chatLog.value += '\n\n';
       chatLog.scrollTop = chatLog.scrollHeight;
     } catch (err) {
       chatLog.value += `[error: ${err.message}]\n`;
@@ -0,0 +1,43 @@
+// Reads a server-sent-event response from a POST fetch (EventSource only
+// supports GET). Calls onDelta(text) for every streamed piece and resolves
+// with the payload of the final "done" event. Rejects on an "error" event,
+// and when the stream ends without a "done" (a dropped connection or a
+// proxy cutting it off), so callers never mistake partial text for a result.
+async function readEventStream(res, onDelta) {
+  if (!res.ok || !res.body) {
+    const json = await res.json().catch(() => ({}));
+    throw new Error(json.error || 'Request failed');
+  }
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let result = null;
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let sep;
+    while ((sep = buffer.indexOf('\n\n')) !== -1) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+
+      let event = 'message';
+      let data = '';
+      raw.split('\n').forEach(line => {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      });
+      if (!data) continue;
+
+      const payload = JSON.parse(data);
+      if (event === 'error') throw new Error(payload.error || 'Stream failed');
+      if (event === 'done') result = payload;
+      else if (payload.delta) onDelta(payload.delta);
+    }
+  }
+  if (result === null) throw new Error('Connection lost before the response was complete');
+  return result;
+}
@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import blobstore
+import storage
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """storage pointed at an empty study DB, blob store and legacy JSON
+    path under tmp_path. Nothing is opened until the first storage call."""
+    monkeypatch.setattr(storage, "DB", str(tmp_path / "study_data.db"))
+    monkeypatch.setattr(storage, "LEGACY_JSON", str(tmp_path / "study_data.json"))
+    monkeypatch.setattr(blobstore, "BLOB_DIR", str(tmp_path / "study_blobs"))
+    return tmp_path
+
+
+@pytest.fixture
+def client(store):
+    """A test client for both blueprints, without the background threads
+    app.create_app() starts."""
+    from flask import Flask
+    import heavy_routes
+    import light_routes
+
+    app = Flask(__name__)
+    app.config["DEFAULT_MODEL"] = "test-model"
+    app.register_blueprint(light_routes.bp)
+    app.register_blueprint(heavy_routes.bp)
+    return app.test_client()
@@ -0,0 +1,104 @@
+import time
+import threading
+
+import pytest
+
+import admission
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(admission, "ENABLED", True)
+    monkeypatch.setattr(admission, "_buckets", {})
+    monkeypatch.setattr(admission, "_queue", admission.FairQueue(1, 8, 4))
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_empty_bucket_is_a_429_until_it_refills(monkeypatch):
+    monkeypatch.setitem(admission.ENDPOINT_LIMITS, "generate_cards", (6, 2))  # a token every 10 s
+    for _ in range(2):
+        admission.enter("alice", "generate_cards")()
+
+    with pytest.raises(admission.Rejected) as rejected:
+        admission.enter("alice", "generate_cards")
+    assert rejected.value.status == 429
+    assert 1 <= rejected.value.retry_after <= 10
+
+    # Buckets are per user and per endpoint.
+    admission.enter("bob", "generate_cards")()
+    admission.enter("alice", "ask")()
+    now = time.monotonic()
+    assert admission._take_token("alice", "generate_cards", now + 10) == 0
+
+
+def test_waiters_are_served_round_robin_by_user():
+    queue = admission.FairQueue(1, 8, 4)
+    queue.acquire("holder", 1)
+    served = []
+
+    def wait(username, label):
+        queue.acquire(username, 5)
+        served.append(label)
+
+    threads = []
+    for username, label in [("alice", "a1"), ("alice", "a2"), ("alice", "a3"), ("bob", "b1"), ("carol", "c1")]:
+        threads.append(threading.Thread(target=wait, args=(username, label)))
+        threads[-1].start()
+        _wait_for(lambda: queue.waiting() == len(threads))
+
+    for n in range(1, len(threads) + 1):
+        queue.release()
+        _wait_for(lambda: len(served) == n)
+    for t in threads:
+        t.join()
+
+    assert served == ["a1", "b1", "c1", "a2", "a3"]
+
+
+def test_full_user_queue_is_a_429():
+    queue = admission.FairQueue(1, 8, 1)
+    queue.acquire("alice", 1)
+    waiter = threading.Thread(target=queue.acquire, args=("alice", 5))
+    waiter.start()
+    _wait_for(lambda: queue.waiting() == 1)
+
+    with pytest.raises(admission.Rejected) as rejected:
+        queue.acquire("alice", 1)
+    assert rejected.value.status == 429
+
+    queue.release()
+    waiter.join()
+
+
+def test_waiting_too_long_is_a_503():
+    queue = admission.FairQueue(1, 8, 4)
+    queue.acquire("alice", 1)
+
+    with pytest.raises(admission.Rejected) as rejected:
+        queue.acquire("bob", 0.05)
+    assert rejected.value.status == 503
+    assert queue.waiting() == 0
+
+
+def test_invalid_requests_get_their_token_back(client, monkeypatch):
+    monkeypatch.setitem(admission.ENDPOINT_LIMITS, "generate_cards", (6, 2))
+    headers = {"Username": "alice"}
+
+    for _ in range(5):
+        assert client.post("/generate-cards", headers=headers, json={"filenames": ["a.txt"]}).status_code == 400
+        assert client.post("/generate-cards", headers=headers, json={"course": "bio", "filenames": ["a.txt"]}) \
+            .status_code == 404
+        assert client.post("/generate-cards", headers=headers, data="{not json",
+                           content_type="application/json").status_code == 400
+
+    # The whole burst is still there.
+    for _ in range(2):
+        admission.enter("alice", "generate_cards")()
+    with pytest.raises(admission.Rejected):
+        admission.enter("alice", "generate_cards")
@@ -0,0 +1,60 @@
+import pytest
+
+import dedupe
+import storage
+
+DUE = "2024-01-01T00:00:00"
+ATP = {"question": "What molecule stores energy in the cell?", "answer": "ATP, adenosine triphosphate",
+       "next_review": DUE}
+# One word added: 6 of 7 shingles shared.
+ATP_LONGER = dict(ATP, answer="ATP, adenosine triphosphate, mainly")
+# One word changed: 5 of 8 shingles shared.
+ATP_REWORDED = dict(ATP, question="What molecule stores chemical energy in the cell?")
+RIBOSOME = {"question": "Where are proteins made?", "answer": "On ribosomes", "next_review": DUE}
+
+
+def _find(card, course="bio"):
+    conn = storage._connect()
+    return dedupe.find_duplicate(conn, "alice", course, card,
+                                 lambda ids: storage._load_cards(conn, "alice", course, ids))
+
+
+def test_stopwords_and_case_do_not_matter():
+    assert dedupe.shingles({"question": "What is THE cell?", "answer": "A unit"}) == \
+        dedupe.shingles({"question": "what is a cell", "answer": "the unit!"})
+
+
+def test_threshold_decides_near_duplicates(store, monkeypatch):
+    storage.add_cards("alice", "bio", [dict(ATP)])
+    similarity = dedupe.jaccard(dedupe.shingles(ATP), dedupe.shingles(ATP_LONGER))
+    assert similarity == 6 / 7
+
+    monkeypatch.setattr(dedupe, "THRESHOLD", similarity)
+    assert _find(ATP_LONGER) == 1
+    monkeypatch.setattr(dedupe, "THRESHOLD", similarity + 0.01)
+    assert _find(ATP_LONGER) is None
+
+
+def test_default_threshold(store):
+    storage.add_cards("alice", "bio", [dict(ATP)])
+
+    assert _find(dict(ATP)) == 1
+    assert _find(ATP_LONGER) == 1
+    assert dedupe.jaccard(dedupe.shingles(ATP), dedupe.shingles(ATP_REWORDED)) < dedupe.THRESHOLD
+    assert _find(ATP_REWORDED) is None
+    assert _find(RIBOSOME) is None
+
+
+def test_other_courses_are_not_compared(store):
+    storage.add_cards("alice", "chem", [dict(ATP)])
+
+    assert _find(dict(ATP), course="bio") is None
+
+
+@pytest.mark.parametrize("skip", [True, False])
+def test_add_cards_skips_duplicates_within_a_batch(store, skip):
+    stored = storage.add_cards("alice", "bio", [dict(ATP), dict(RIBOSOME), dict(ATP)], skip_duplicates=skip)
+
+    assert [c["question"] for c in stored] == \
+        ([ATP["question"], RIBOSOME["question"]] if skip else [ATP["question"], RIBOSOME["question"], ATP["question"]])
+    assert [c["id"] for c in stored] == list(range(1, len(stored) + 1))
@@ -0,0 +1,76 @@
+import datetime
+
+import pytest
+
+import jobs
+import storage
+
+
+class _Pool:
+    def __init__(self):
+        self.shut_down = False
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+def test_late_crash_report_keeps_the_fresh_pool(monkeypatch):
+    broken, fresh = _Pool(), _Pool()
+    monkeypatch.setattr(jobs, "_executor", broken)
+
+    jobs._reset_pool(broken)
+    monkeypatch.setattr(jobs, "_executor", fresh)  # a newer upload started one
+    jobs._reset_pool(broken)
+
+    assert broken.shut_down
+    assert not fresh.shut_down
+    assert jobs._executor is fresh
+
+
+def test_failed_submit_gives_back_slots_and_spool_files(store, monkeypatch):
+    paths = []
+    for i in range(2):
+        path = store / f"upload-{i}"
+        path.write_text("text")
+        paths.append(str(path))
+
+    def fail(*args):
+        raise OSError("disk full")
+    monkeypatch.setattr(storage, "create_job", fail)
+
+    with pytest.raises(OSError):
+        jobs.submit("alice", "bio", [(f"f{i}.txt", path, f"digest{i}") for i, path in enumerate(paths)])
+    assert jobs.pending() == 0
+    assert not any((store / f"upload-{i}").exists() for i in range(2))
+
+
+def _age_job(job_id, seconds):
+    created = (datetime.datetime.now() - datetime.timedelta(seconds=seconds)).isoformat()
+    with storage.transaction() as conn:
+        conn.execute("UPDATE jobs SET created = ? WHERE id = ?", (created, job_id))
+
+
+def test_job_left_unfinished_is_reported_failed(store):
+    storage.create_job("j1", "alice", "bio", 2)
+    storage.finish_job_file("j1", "a.txt")
+    assert storage.get_job("alice", "j1")["status"] == "running"
+
+    _age_job("j1", storage.JOB_STALE_SECONDS + 60)
+
+    job = storage.get_job("alice", "j1")
+    assert job["status"] == "failed"
+    assert job["done"] == ["a.txt"]
+    assert job["error"]
+
+
+def test_compaction_expires_old_jobs_finished_or_not(store):
+    for job_id, total in (("finished", 1), ("stuck", 2), ("recent", 2)):
+        storage.create_job(job_id, "alice", "bio", total)
+        storage.finish_job_file(job_id, "a.txt")
+    _age_job("finished", storage.JOB_TTL_SECONDS + 60)
+    _age_job("stuck", storage.JOB_TTL_SECONDS + 60)
+
+    assert storage.compact(pause=0)["jobs_expired"] == 2
+    assert storage.get_job("alice", "finished") is None
+    assert storage.get_job("alice", "stuck") is None
+    assert storage.get_job("alice", "recent")["status"] == "running"
@@ -0,0 +1,138 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import llm
+import metrics
+
+openai = pytest.importorskip("openai")
+try:
+    import httpx
+except ImportError:  # SDK releases built on httpx2
+    import httpx2 as httpx
+
+
+def _status_error(cls, status):
+    request = httpx.Request("POST", "https://api.test/v1/chat/completions")
+    return cls(f"HTTP {status}", response=httpx.Response(status, request=request), body=None)
+
+
+def _reply(text):
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """A fake API answering each call with the next scripted outcome; the
+    model gets one slot and backoff sleeps are recorded, not slept."""
+    script, calls, sleeps = [], [], []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        outcome = script.pop(0)
+        if callable(outcome):
+            outcome = outcome()
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def sleep(seconds):
+        # The model's only slot must be free while backing off.
+        gate = llm._gate("m")
+        assert gate.acquire(blocking=False)
+        gate.release()
+        sleeps.append(seconds)
+
+    monkeypatch.setattr(llm, "client", lambda: SimpleNamespace(chat=SimpleNamespace(
+        completions=SimpleNamespace(create=create))))
+    monkeypatch.setattr(llm, "_gates", {})
+    monkeypatch.setattr(llm, "MODEL_CONCURRENCY", {"m": 1})
+    monkeypatch.setattr(llm, "MAX_RETRIES", 3)
+    monkeypatch.setattr(llm, "QUEUE_TIMEOUT_SECONDS", 0.05)
+    monkeypatch.setattr(llm.time, "sleep", sleep)
+    return SimpleNamespace(script=script, calls=calls, sleeps=sleeps)
+
+
+def _slot_free():
+    gate = llm._gate("m")
+    if not gate.acquire(blocking=False):
+        return False
+    gate.release()
+    return True
+
+
+def test_retries_rate_limits_and_server_errors(upstream):
+    upstream.script += [_status_error(openai.RateLimitError, 429),
+                        _status_error(openai.InternalServerError, 503), _reply("  answer \n")]
+
+    assert llm.complete("m", "sys", "prompt") == "answer"
+    assert len(upstream.calls) == 3
+    assert len(upstream.sleeps) == 2
+    assert upstream.sleeps[0] <= 1 and upstream.sleeps[1] <= 2
+    assert _slot_free()
+
+
+def test_gives_up_after_max_retries(upstream):
+    upstream.script += [_status_error(openai.RateLimitError, 429) for _ in range(llm.MAX_RETRIES + 1)]
+
+    with pytest.raises(openai.RateLimitError):
+        llm.complete("m", "sys", "prompt")
+    assert len(upstream.calls) == llm.MAX_RETRIES + 1
+    assert len(upstream.sleeps) == llm.MAX_RETRIES
+    assert _slot_free()
+
+
+def test_client_errors_are_not_retried(upstream):
+    upstream.script += [_status_error(openai.BadRequestError, 400)]
+
+    with pytest.raises(openai.BadRequestError):
+        llm.complete("m", "sys", "prompt")
+    assert len(upstream.calls) == 1
+    assert upstream.sleeps == []
+    assert _slot_free()
+
+
+def test_busy_when_no_slot_frees_up(upstream):
+    gate = llm._gate("m")
+    gate.acquire()
+    try:
+        with pytest.raises(llm.Busy):
+            llm.complete("m", "sys", "prompt")
+    finally:
+        gate.release()
+    assert upstream.calls == []
+
+
+def test_stream_holds_the_slot_until_closed(upstream):
+    chunk = SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content="piece"))])
+    upstream.script += [_status_error(openai.InternalServerError, 500), iter([chunk, chunk])]
+
+    pieces = llm.stream("m", "sys", "prompt")
+    assert next(pieces) == "piece"
+    assert not _slot_free()
+    pieces.close()
+    assert _slot_free()
+    assert len(upstream.sleeps) == 1
+
+
+
+def test_latency_excludes_slot_waits_and_retries(upstream):
+    def slow_failure():
+        threading.Event().wait(0.2)
+        return _status_error(openai.InternalServerError, 503)
+
+    def totals():
+        counts, seconds = metrics.LLM_SECONDS._values.get(("m", "complete"), ([0], 0.0))
+        waits, _ = metrics.LLM_QUEUE_SECONDS._values.get(("m",), ([0], 0.0))
+        return sum(counts), seconds, sum(waits), metrics.LLM_RETRIES._values.get(("m", "InternalServerError"), 0)
+
+    calls, seconds, waits, retries = totals()
+    upstream.script += [slow_failure, _reply("answer")]
+
+    assert llm.complete("m", "sys", "prompt") == "answer"
+    after = totals()
+    assert after[0] == calls + 1
+    assert after[1] - seconds < 0.2
+    assert after[2] == waits + 2
+    assert after[3] == retries + 1
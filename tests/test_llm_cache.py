@@ -0,0 +1,55 @@
+import json
+import threading
+
+import pytest
+
+import llm
+import llm_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "CACHE_DB", str(tmp_path / "llm_cache.db"))
+    monkeypatch.setattr(llm_cache, "_local", threading.local())
+    monkeypatch.setattr(llm_cache, "ENABLED", True)
+
+
+def _model(*replies):
+    calls = []
+
+    def call():
+        calls.append(1)
+        return replies[len(calls) - 1]
+    return call, calls
+
+
+def test_malformed_reply_is_not_cached(cache):
+    call, calls = _model('[{"question": "Q", "ans', '[{"question": "Q", "answer": "A"}]')
+
+    first = llm_cache.cached_call("m", "sys", "prompt", call, validate=llm.parse_json_array)
+    with pytest.raises(ValueError):
+        llm.parse_json_array(first)
+    second = llm_cache.cached_call("m", "sys", "prompt", call, validate=llm.parse_json_array)
+    third = llm_cache.cached_call("m", "sys", "prompt", call, validate=llm.parse_json_array)
+
+    assert json.loads(second) == [{"question": "Q", "answer": "A"}]
+    assert third == second
+    assert len(calls) == 2
+
+
+def test_malformed_cached_entry_is_replaced(cache):
+    key = llm_cache.make_key("m", "sys", "prompt")
+    llm_cache.put(key, "m", "Sorry, I cannot help with that.")
+    call, calls = _model("[1, 2]")
+
+    assert llm_cache.cached_call("m", "sys", "prompt", call, validate=llm.parse_json_array) == "[1, 2]"
+    assert llm_cache.get(key) == "[1, 2]"
+    assert len(calls) == 1
+
+
+def test_unvalidated_replies_are_cached_as_is(cache):
+    call, calls = _model("**Title**\nSummary")
+
+    for _ in range(2):
+        assert llm_cache.cached_call("m", "sys", "prompt", call) == "**Title**\nSummary"
+    assert len(calls) == 1
@@ -0,0 +1,51 @@
+import blobstore
+import storage
+
+
+def _add_file(username, course, name, text):
+    storage.add_files(username, course, [{"name": name, "kind": "text", "blob": blobstore.put_text(text),
+                                          "size": len(text), "pages": None}])
+
+
+def test_search_stays_within_the_course(store):
+    _add_file("alice", "bio", "cells.txt", "Mitochondria produce ATP for the cell.")
+    _add_file("alice", "chem", "bonds.txt", "Mitochondria in chemistry class: covalent bonds.")
+    _add_file("bob", "bio", "cells.txt", "Bob's notes: mitochondria are organelles.")
+
+    assert storage.search_context("alice", "bio", "mitochondria") == ["Mitochondria produce ATP for the cell."]
+    assert storage.search_context("bob", "bio", "mitochondria") == ["Bob's notes: mitochondria are organelles."]
+
+
+def test_best_match_comes_first(store):
+    _add_file("alice", "bio", "a.txt", "Ribosomes translate messenger RNA into protein.")
+    _add_file("alice", "bio", "b.txt", "Photosynthesis happens in chloroplasts; chloroplasts hold chlorophyll.")
+
+    assert storage.search_context("alice", "bio", "Where do chloroplasts fit in?")[0].startswith("Photosynthesis")
+
+
+def test_no_match_falls_back_to_the_course_start(store):
+    _add_file("alice", "bio", "intro.txt", "Welcome to biology.")
+    _add_file("alice", "bio", "cells.txt", "Cells are the unit of life.")
+    _add_file("alice", "chem", "intro.txt", "Welcome to chemistry.")
+
+    expected = ["Welcome to biology.", "Cells are the unit of life."]
+    assert storage.search_context("alice", "bio", "what is this course about zzzz") == expected
+    assert storage.search_context("alice", "bio", "???") == expected
+    assert storage.search_context("alice", "physics", "anything") == []
+
+
+def test_query_syntax_is_treated_as_words(store):
+    _add_file("alice", 'bio" OR scope:x', "cells.txt", "Cells divide by mitosis.")
+
+    for query in ['mitosis"', "mitosis AND NOT", "NEAR(mitosis cells)", "mito*", "scope:anything mitosis"]:
+        assert storage.search_context("alice", 'bio" OR scope:x', query) == ["Cells divide by mitosis."]
+
+
+def test_budget_and_deleted_files(store):
+    _add_file("alice", "bio", "long.txt", "enzyme " * 100)
+    _add_file("alice", "bio", "short.txt", "An enzyme speeds up a reaction.")
+
+    assert storage.search_context("alice", "bio", "enzyme", budget=100) == ["An enzyme speeds up a reaction."]
+
+    storage.delete_files("alice", "bio", "short.txt")
+    assert "An enzyme speeds up a reaction." not in storage.search_context("alice", "bio", "enzyme")
@@ -0,0 +1,113 @@
+import datetime
+
+import pytest
+
+import light_routes
+import storage
+
+HEADERS = {"Username": "alice"}
+
+
+def _deck(*cards):
+    now = datetime.datetime.now()
+    storage.add_cards("alice", "bio", [
+        dict({"question": f"Q{i}", "answer": f"A{i}", "review_count": 0, "interval": 1, "ease_factor": 2.5,
+              "next_review": now.isoformat()}, **card)
+        for i, card in enumerate(cards)
+    ])
+
+
+def _grade(client, *grades):
+    return client.post("/answer-cards", headers=HEADERS, json={"course": "bio", "grades": list(grades)})
+
+
+def _next_review(card_id):
+    return datetime.datetime.fromisoformat(storage.get_card("alice", "bio", card_id)["next_review"])
+
+
+def _close(a, b):
+    return abs((a - b).total_seconds()) < 5
+
+
+@pytest.mark.parametrize("grade", [
+    {"quality": 4},
+    {"cardId": None, "quality": 4},
+    {"cardId": True, "quality": 4},
+    {"cardId": "one", "quality": 4},
+    {"cardId": 1},
+    {"cardId": 1, "quality": 6},
+    {"cardId": 1, "quality": -1},
+    {"cardId": 1, "quality": "5"},
+    {"cardId": 1, "quality": 4.5},
+    {"cardId": 1, "quality": True},
+])
+def test_malformed_grades_are_rejected(client, grade):
+    _deck({})
+    before = storage.get_card("alice", "bio", 1)
+
+    assert _grade(client, grade).status_code == 400
+    assert storage.get_card("alice", "bio", 1) == before
+
+
+def test_digit_string_ids_are_applied_and_unknown_ids_reported(client):
+    _deck({})
+
+    response = _grade(client, {"cardId": "1", "quality": 5}, {"cardId": 7, "quality": 5})
+
+    assert response.status_code == 200
+    assert response.get_json()["updated"] == 1
+    assert response.get_json()["missing"] == [7]
+    assert storage.get_card("alice", "bio", 1)["review_count"] == 1
+
+
+def test_future_answer_time_counts_from_now(client):
+    _deck({})
+    tomorrow = datetime.datetime.now() + datetime.timedelta(days=1)
+
+    _grade(client, {"cardId": 1, "quality": 5, "answered_at": tomorrow.isoformat()})
+
+    assert _close(_next_review(1), datetime.datetime.now() + datetime.timedelta(days=1))
+
+
+def test_stale_answer_time_is_clamped_to_the_review_window(client):
+    _deck({})
+    last_week = datetime.datetime.now() - datetime.timedelta(days=7)
+
+    _grade(client, {"cardId": 1, "quality": 5, "answered_at": last_week.isoformat()})
+
+    # Counted from REVIEW_WINDOW ago, plus the new 1-day interval.
+    expected = datetime.datetime.now() - light_routes.REVIEW_WINDOW + datetime.timedelta(days=1)
+    assert _close(_next_review(1), expected)
+
+
+def test_late_grade_cannot_predate_the_last_review(client):
+    # Last scheduled two hours ago: due in 6 days, interval 6.
+    last_review = datetime.datetime.now() - datetime.timedelta(hours=2)
+    _deck({"review_count": 2, "interval": 6,
+           "next_review": (last_review + datetime.timedelta(days=6)).isoformat()})
+    earlier = last_review - datetime.timedelta(hours=5)
+
+    _grade(client, {"cardId": 1, "quality": 1, "answered_at": earlier.isoformat()})
+
+    assert _close(_next_review(1), last_review + datetime.timedelta(days=1))
+
+
+def test_timezone_aware_answer_times_are_converted_to_local():
+    answered = datetime.datetime.now().astimezone() - datetime.timedelta(hours=3)
+
+    result = light_routes._answered_at(answered.astimezone(datetime.timezone.utc).isoformat())
+
+    assert result.tzinfo is None
+    assert _close(result, answered.replace(tzinfo=None))
+
+
+def test_grades_apply_in_answer_order(client):
+    _deck({})
+    now = datetime.datetime.now()
+
+    # Sent out of order: the fail came first, then the pass.
+    _grade(client,
+           {"cardId": 1, "quality": 5, "answered_at": (now - datetime.timedelta(minutes=1)).isoformat()},
+           {"cardId": 1, "quality": 1, "answered_at": (now - datetime.timedelta(minutes=2)).isoformat()})
+
+    assert storage.get_card("alice", "bio", 1)["review_count"] == 1
@@ -0,0 +1,118 @@
+import json
+import base64
+import sqlite3
+
+import storage
+
+# A 1x1 PNG, as the legacy store kept images: base64 text.
+PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+)
+
+
+def _card(card_id, question, next_review, **schedule):
+    return dict({"id": card_id, "question": question, "answer": question + "!", "next_review": next_review},
+                **schedule)
+
+
+LEGACY = {
+    "alice": {
+        "files": {
+            "bio": [
+                {"name": "cells.txt", "text": "Mitochondria are the powerhouse of the cell."},
+                {"name": "cell.png", "text": base64.b64encode(PNG).decode()},
+            ],
+        },
+        "cards": {
+            "bio": [
+                _card(1, "What is ATP", "2024-01-03T00:00:00", interval=6, ease_factor=2.36, review_count=2),
+                _card(2, "What is a ribosome", "2024-01-01T00:00:00"),
+                {"question": "never got an id", "answer": "dropped"},
+            ],
+        },
+        "summaries": [{"course": "bio", "summary": "**Cells**\nThey are small."}],
+        "quizzes": [{"timestamp": "2024-01-01T10:00:00", "course": "bio", "files": ["cells.txt"],
+                     "questions": [{"question": "Powerhouse?", "options": {"A": "Mitochondria", "B": "Nucleus",
+                                                                           "C": "Ribosome", "D": "Wall"},
+                                    "correctAnswer": "A"}]}],
+        "todos": ["read chapter 2", "read chapter 2"],
+    },
+    "bob": {"todos": ["sleep"]},
+}
+
+
+def _user_version():
+    return storage._connect().execute("PRAGMA user_version").fetchone()[0]
+
+
+def _count(table):
+    return storage._connect().execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_legacy_json_is_imported_on_first_start(store):
+    (store / "study_data.json").write_text(json.dumps(LEGACY))
+
+    assert storage.list_todos("alice") == ["read chapter 2"]
+    assert _user_version() == len(storage.MIGRATIONS)
+    assert storage.list_todos("bob") == ["sleep"]
+
+    files = {f["name"]: f for f in storage.get_files("alice", "bio")}
+    assert storage.file_text(files["cells.txt"]) == "Mitochondria are the powerhouse of the cell."
+    assert files["cell.png"]["kind"] == "image"
+    assert files["cell.png"]["size"] == len(PNG)
+    assert storage.file_text(files["cell.png"]) == base64.b64encode(PNG).decode()
+
+    ribosome, atp = storage.due_cards("alice", "bio", 10)
+    assert (ribosome["id"], atp["id"]) == (2, 1)
+    assert sorted(storage.card_schedules("alice", "bio")) == [
+        (1.0, 2.5, 0, storage._due(ribosome)),
+        (6.0, 2.36, 2, storage._due(atp)),
+    ]
+
+    records = list(storage.iter_records("alice"))
+    assert [r["summary"] for r in records if r["type"] == "summary"] == ["**Cells**\nThey are small."]
+    assert [r["files"] for r in records if r["type"] == "quiz"] == [["cells.txt"]]
+    assert storage.search_context("alice", "bio", "powerhouse")
+
+
+def test_legacy_json_is_imported_once(store):
+    (store / "study_data.json").write_text(json.dumps(LEGACY))
+    storage._connect()
+
+    assert storage.migrate_json() == 0
+    assert _count("cards") == 2
+    assert _count("todos") == 2
+
+
+def test_upgrade_from_first_schema_version(store):
+    # A database written by the first SQLite release: file text inline,
+    # cards as bare JSON with no schedule columns or indexes.
+    conn = sqlite3.connect(storage.DB, isolation_level=None)
+    conn.executescript(storage.MIGRATIONS[0])
+    conn.execute("PRAGMA user_version = 1")
+    conn.execute("INSERT INTO files (username, course, name, text) VALUES ('alice', 'bio', 'cells.txt', ?)",
+                 ("Mitochondria are the powerhouse of the cell.",))
+    conn.execute("INSERT INTO files (username, course, name, text) VALUES ('alice', 'bio', 'cell.png', ?)",
+                 (base64.b64encode(PNG).decode(),))
+    for card in LEGACY["alice"]["cards"]["bio"][:2]:
+        conn.execute("INSERT INTO cards (username, course, id, data) VALUES ('alice', 'bio', ?, ?)",
+                     (card["id"], json.dumps(card)))
+    conn.execute("INSERT INTO summaries (username, course, summary) VALUES ('alice', 'bio', 'Cells are small.')")
+    conn.close()
+
+    assert _user_version() == len(storage.MIGRATIONS)
+
+    files = {f["name"]: f for f in storage.get_files("alice", "bio")}
+    assert storage.file_text(files["cells.txt"]) == "Mitochondria are the powerhouse of the cell."
+    assert files["cell.png"]["kind"] == "image"
+    assert files["cell.png"]["size"] == len(PNG)
+    assert storage.file_text(files["cell.png"]) == base64.b64encode(PNG).decode()
+
+    assert [c["id"] for c in storage.due_cards("alice", "bio", 10)] == [2, 1]
+    assert [s[:3] for s in sorted(storage.card_schedules("alice", "bio"))] == [(1.0, 2.5, 0), (6.0, 2.36, 2)]
+    assert _count("card_bands") > 0
+    assert storage.search_context("alice", "bio", "powerhouse")
+
+    # The near-duplicate index built by the upgrade is live.
+    assert storage.add_cards("alice", "bio", [_card(None, "What is ATP", "2024-01-05T00:00:00")],
+                             skip_duplicates=True) == []
@@ -0,0 +1,60 @@
+import io
+
+import pytest
+
+import blobstore
+import storage
+import transfer
+
+
+def _seed():
+    writer = blobstore.BlobWriter()
+    for page in ("Page one: cells.", "Page two: mitochondria.", "Page three: ribosomes."):
+        writer.write_segment(page)
+    digest, size, _ = writer.finish()
+    storage.add_files("alice", "bio", [{"name": "notes.pdf", "kind": "text", "blob": digest,
+                                         "size": size, "pages": 3}])
+    storage.add_files("alice", "bio", [{"name": "cell.png", "kind": "image",
+                                         "blob": blobstore.put(b"\x89PNG fake", compress=False),
+                                         "size": 9, "pages": None}])
+    storage.add_cards("alice", "bio", [
+        {"question": "What is ATP", "answer": "Energy", "next_review": "2024-01-03T00:00:00",
+         "interval": 6, "ease_factor": 2.36, "review_count": 2},
+        {"question": "What is a ribosome", "answer": "Protein factory", "next_review": "2024-01-01T00:00:00"},
+    ])
+    storage.add_summary("alice", "bio", "**Cells**\nThey are small.")
+    storage.add_quiz("alice", "bio", "2024-01-01T10:00:00", ["notes.pdf"],
+                     [{"question": "Powerhouse?", "options": {"A": "Mitochondria"}, "correctAnswer": "A"}])
+    storage.add_todo("alice", "read chapter 2")
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_export_import_round_trip(store, compress):
+    _seed()
+    bundle = b"".join(transfer.dump("alice", compress=compress))
+
+    counts = transfer.import_stream("carol", io.BytesIO(bundle))
+
+    assert counts == {"files": 2, "cards": 2, "summaries": 1, "quizzes": 1, "todos": 1}
+    assert list(storage.iter_records("carol")) == list(storage.iter_records("alice"))
+    notes = storage.get_files("carol", "bio", ["notes.pdf"])[0]
+    assert storage.read_pages(notes, 2) == "Page two: mitochondria."
+    assert [c["id"] for c in storage.due_cards("carol", "bio", 10)] == [2, 1]
+
+
+def test_import_into_one_course(store):
+    _seed()
+    bundle = b"".join(transfer.dump("alice", "bio"))
+
+    counts = transfer.import_stream(None, io.BytesIO(bundle), course="chem")
+
+    # Course exports leave todos out; records land in the given course of
+    # the user the bundle came from, next to what is already there.
+    assert counts == {"files": 2, "cards": 2, "summaries": 1, "quizzes": 1, "todos": 0}
+    assert storage.list_file_names("alice", "chem") == storage.list_file_names("alice", "bio")
+    assert len(storage.due_cards("alice", "chem", 10)) == 2
+
+
+def test_malformed_bundle_is_rejected(store):
+    with pytest.raises(ValueError):
+        transfer.import_stream("carol", io.BytesIO(b'{"type": "card"}\n'))